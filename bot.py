@@ -4,7 +4,6 @@ __version__ = "3.4.1"
 import asyncio
 import logging
 import os
-import re
 import sys
 import typing
 from datetime import datetime
@@ -34,8 +33,11 @@ except ImportError:
 from core import checks
 from core.clients import ApiClient, PluginDatabaseClient
 from core.config import ConfigManager
+from core.indexes import IndexManager
 from core.utils import human_join, normalize_alias
 from core.models import PermissionLevel, SafeFormatter, getLogger, configure_logging
+from core.paginator import ReactionDispatcher
+from core.stores import BlockList, LinkedMessageStore, StateManager
 from core.thread import ThreadManager
 from core.time import human_timedelta
 
@@ -60,8 +62,17 @@ class ModmailBot(commands.Bot):
 
         self.config = ConfigManager(self)
         self.config.populate_cache()
+        self.stores = StateManager(self)
+        # user id -> (blocked, until, block record), see `is_blocked`
+        self._block_verdicts = {}
+        self._block_verdicts_generation = None
+        # background log maintenance, started once per process (on_ready runs on every reconnect)
+        self._log_maintenance_tasks = {}
 
         self.threads = ThreadManager(self)
+        self.linked_messages = LinkedMessageStore(self)
+        self.indexes = IndexManager(self)
+        self.reactions = ReactionDispatcher(self)
 
         self.log_file_name = os.path.join(temp_dir, f"{self.token.split('.')[0]}.log")
         self._configure_logging()
@@ -168,6 +179,14 @@ class ModmailBot(commands.Bot):
         except Exception:
             logger.critical("Fatal exception", exc_info=True)
         finally:
+            try:
+                self.loop.run_until_complete(
+                    asyncio.gather(
+                        self.config.flush(), self.stores.flush(), self.api.log_writer.flush()
+                    )
+                )
+            except Exception:
+                logger.error("Failed to save the config.", exc_info=True)
             self.loop.run_until_complete(self.logout())
             for task in asyncio.all_tasks(self.loop):
                 task.cancel()
@@ -231,12 +250,12 @@ class ModmailBot(commands.Bot):
         await self.config.wait_until_ready()
 
     @property
-    def snippets(self) -> typing.Dict[str, str]:
-        return self.config["snippets"]
+    def snippets(self) -> typing.MutableMapping[str, str]:
+        return self.stores.snippets
 
     @property
-    def aliases(self) -> typing.Dict[str, str]:
-        return self.config["aliases"]
+    def aliases(self) -> typing.MutableMapping[str, str]:
+        return self.stores.aliases
 
     @property
     def token(self) -> str:
@@ -315,8 +334,8 @@ class ModmailBot(commands.Bot):
         return None
 
     @property
-    def blocked_users(self) -> typing.Dict[str, str]:
-        return self.config["blocked"]
+    def blocked_users(self) -> BlockList:
+        return self.stores.blocked
 
     @property
     def blocked_whitelisted_users(self) -> typing.List[str]:
@@ -377,30 +396,21 @@ class ModmailBot(commands.Bot):
 
         logger.debug("Connected to gateway.")
         await self.config.refresh()
+        self.config.sync.start()
+        await self.stores.load()
         await self.setup_indexes()
         self._connected.set()
 
     async def setup_indexes(self):
-        """Setup text indexes so we can use the $search operator"""
-        coll = self.db.logs
-        index_name = "messages.content_text_messages.author.name_text_key_text"
-
-        index_info = await coll.index_information()
-
-        # Backwards compatibility
-        old_index = "messages.content_text_messages.author.name_text"
-        if old_index in index_info:
-            logger.info("Dropping old index: %s", old_index)
-            await coll.drop_index(old_index)
-
-        if index_name not in index_info:
-            logger.info('Creating "text" index for logs collection.')
-            logger.info("Name: %s", index_name)
-            await coll.create_index(
-                [("messages.content", "text"), ("messages.author.name", "text"), ("key", "text")]
-            )
+        """Creates the database indexes and the logs view, once per `IndexManager.version`."""
+        if await self.indexes.setup():
+            await self.api.create_logs_view()
         logger.debug("Successfully configured and verified database indexes.")
 
+    def _start_log_maintenance(self, name: str) -> None:
+        if name not in self._log_maintenance_tasks:
+            self._log_maintenance_tasks[name] = self.loop.create_task(getattr(self.api, name)())
+
     async def on_ready(self):
         """Bot startup, sets uptime."""
 
@@ -429,38 +439,10 @@ class ModmailBot(commands.Bot):
         await self.threads.populate_cache()
 
         # closures
-        closures = self.config["closures"]
-        logger.info("There are %d thread(s) pending to be closed.", len(closures))
+        count = self.threads.closures.restore()
+        logger.info("There are %d thread(s) pending to be closed.", count)
         logger.line()
 
-        for recipient_id, items in tuple(closures.items()):
-            after = (datetime.fromisoformat(items["time"]) - datetime.utcnow()).total_seconds()
-            if after <= 0:
-                logger.debug("Closing thread for recipient %s.", recipient_id)
-                after = 0
-            else:
-                logger.debug(
-                    "Thread for recipient %s will be closed after %s seconds.", recipient_id, after
-                )
-
-            thread = await self.threads.find(recipient_id=int(recipient_id))
-
-            if not thread:
-                # If the channel is deleted
-                logger.debug("Failed to close thread for recipient %s.", recipient_id)
-                self.config["closures"].pop(recipient_id)
-                await self.config.update()
-                continue
-
-            await thread.close(
-                closer=self.get_user(items["closer_id"]),
-                after=after,
-                silent=items["silent"],
-                delete_channel=items["delete_channel"],
-                message=items["message"],
-                auto_close=items.get("auto_close", False),
-            )
-
         for log in await self.api.get_open_logs():
             if self.get_channel(int(log["channel_id"])) is None:
                 logger.debug("Unable to resolve thread with channel %s.", log["channel_id"])
@@ -486,6 +468,10 @@ class ModmailBot(commands.Bot):
                         "Failed to close thread with channel %s, skipping.", log["channel_id"]
                     )
 
+        self._start_log_maintenance("index_participants")
+        if self.api.log_schema == 2:
+            self._start_log_maintenance("migrate_logs")
+
         self.metadata_loop = tasks.Loop(
             self.post_metadata,
             seconds=0,
@@ -548,9 +534,17 @@ class ModmailBot(commands.Bot):
             delta = human_timedelta(min_account_age)
             logger.debug("Blocked due to account age, user %s.", author.name)
 
-            if str(author.id) not in self.blocked_users:
-                new_reason = f"System Message: New Account. Required to wait for {delta}."
-                self.blocked_users[str(author.id)] = new_reason
+            record = self.blocked_users.get(str(author.id))
+            # blocks converted from reason strings don't know when they expire
+            if record is None or (
+                record["source"] == "account_age" and record["expires_at"] is None
+            ):
+                self.blocked_users.block(
+                    author.id,
+                    f"New Account. Required to wait for {delta}.",
+                    expires_at=min_account_age,
+                    source="account_age",
+                )
 
             return False
         return True
@@ -574,43 +568,32 @@ class ModmailBot(commands.Bot):
             delta = human_timedelta(min_guild_age)
             logger.debug("Blocked due to guild age, user %s.", author.name)
 
-            if str(author.id) not in self.blocked_users:
-                new_reason = f"System Message: Recently Joined. Required to wait for {delta}."
-                self.blocked_users[str(author.id)] = new_reason
+            record = self.blocked_users.get(str(author.id))
+            # blocks converted from reason strings don't know when they expire
+            if record is None or (
+                record["source"] == "guild_age" and record["expires_at"] is None
+            ):
+                self.blocked_users.block(
+                    author.id,
+                    f"Recently Joined. Required to wait for {delta}.",
+                    expires_at=min_guild_age,
+                    source="guild_age",
+                )
 
             return False
         return True
 
     def check_manual_blocked(self, author: discord.Member) -> bool:
-        if str(author.id) not in self.blocked_users:
+        record = self.blocked_users.active(author.id)
+        if record is None:
             return True
 
-        blocked_reason = self.blocked_users.get(str(author.id)) or ""
-        now = datetime.utcnow()
-
-        if blocked_reason.startswith("System Message:"):
+        if record["source"] != "manual":
             # Met the limits already, otherwise it would've been caught by the previous checks
             logger.debug("No longer internally blocked, user %s.", author.name)
             self.blocked_users.pop(str(author.id))
             return True
-        # etc "blah blah blah... until 2019-10-14T21:12:45.559948."
-        end_time = re.search(r"until ([^`]+?)\.$", blocked_reason)
-        if end_time is None:
-            # backwards compat
-            end_time = re.search(r"%([^%]+?)%", blocked_reason)
-            if end_time is not None:
-                logger.warning(
-                    r"Deprecated time message for user %s, block and unblock again to update.",
-                    author.name,
-                )
 
-        if end_time is not None:
-            after = (datetime.fromisoformat(end_time.group(1)) - now).total_seconds()
-            if after <= 0:
-                # No longer blocked
-                self.blocked_users.pop(str(author.id))
-                logger.debug("No longer blocked, user %s.", author.name)
-                return True
         logger.debug("User blocked, user %s.", author.name)
         return False
 
@@ -621,13 +604,52 @@ class ModmailBot(commands.Bot):
             return True
         return False
 
+    def invalidate_block_verdict(self, user_id: int = None) -> None:
+        """Forgets the cached `is_blocked` result of a user, or of every user."""
+        if user_id is None:
+            self._block_verdicts.clear()
+        else:
+            self._block_verdicts.pop(int(user_id), None)
+
     async def is_blocked(
         self,
         author: discord.User,
         *,
         channel: discord.TextChannel = None,
         send_message: bool = False,
-    ) -> typing.Tuple[bool, str]:
+    ) -> bool:
+        # any config change (whitelist, account_age, guild_age...) may change the verdicts
+        if self._block_verdicts_generation != self.config.generation:
+            self._block_verdicts.clear()
+            self._block_verdicts_generation = self.config.generation
+
+        verdict = self._block_verdicts.get(author.id)
+        if verdict is not None:
+            blocked, until, record = verdict
+            # the record changes when the user is blocked, unblocked or the block expired
+            if self.blocked_users.get(str(author.id)) is record and (
+                until is None or until > datetime.utcnow()
+            ):
+                return blocked
+
+        blocked = await self._check_blocked(author, channel=channel, send_message=send_message)
+        record = self.blocked_users.get(str(author.id))
+        until = None
+        if blocked and record is not None and record["expires_at"] is not None:
+            until = datetime.fromisoformat(record["expires_at"])
+        elif blocked and (record is None or record["source"] != "manual"):
+            # an age block without expiry has to be checked again on the next message
+            return blocked
+        self._block_verdicts[author.id] = (blocked, until, record)
+        return blocked
+
+    async def _check_blocked(
+        self,
+        author: discord.User,
+        *,
+        channel: discord.TextChannel = None,
+        send_message: bool = False,
+    ) -> bool:
 
         member = self.guild.get_member(author.id)
         if member is None:
@@ -636,21 +658,19 @@ class ModmailBot(commands.Bot):
             author = member
 
         if str(author.id) in self.blocked_whitelisted_users:
-            if str(author.id) in self.blocked_users:
-                self.blocked_users.pop(str(author.id))
-                await self.config.update()
+            self.blocked_users.pop(str(author.id), None)
             return False
 
-        blocked_reason = self.blocked_users.get(str(author.id)) or ""
+        record = self.blocked_users.active(author.id)
 
         if not self.check_account_age(author) or not self.check_guild_age(author):
-            new_reason = self.blocked_users.get(str(author.id))
-            if new_reason != blocked_reason:
+            new_record = self.blocked_users.get(str(author.id))
+            if new_record != record:
                 if send_message:
                     await channel.send(
                         embed=discord.Embed(
                             title="Mensaje no enviado!",
-                            description=new_reason,
+                            description=BlockList.describe(new_record),
                             color=self.error_color,
                         )
                     )
@@ -659,7 +679,6 @@ class ModmailBot(commands.Bot):
         if not self.check_manual_blocked(author):
             return True
 
-        await self.config.update()
         return False
 
     async def get_thread_cooldown(self, author: discord.Member):
@@ -669,16 +688,11 @@ class ModmailBot(commands.Bot):
         if thread_cooldown == isodate.Duration():
             return
 
-        last_log = await self.api.get_latest_user_logs(author.id)
-
-        if last_log is None:
-            logger.debug("Last thread wasn't found, %s.", author.name)
-            return
-
-        last_log_closed_at = last_log.get("closed_at")
+        stats = await self.api.get_recipient_stats(author.id)
+        last_log_closed_at = stats.get("last_closed_at")
 
         if not last_log_closed_at:
-            logger.debug("Last thread was not closed, %s.", author.name)
+            logger.debug("No closed thread was found, %s.", author.name)
             return
 
         try:
@@ -713,7 +727,10 @@ class ModmailBot(commands.Bot):
             return
         sent_emoji, blocked_emoji = await self.retrieve_emoji()
 
-        thread = await self.threads.find(recipient=message.author)
+        # messages sent while the thread is being created are buffered by the thread
+        thread = self.threads.get_pending(message.author.id) or await self.threads.find(
+            recipient=message.author
+        )
         if thread is None:
             delta = await self.get_thread_cooldown(message.author)
             if delta:
@@ -1008,10 +1025,22 @@ class ModmailBot(commands.Bot):
     async def on_raw_reaction_remove(self, payload):
         await self.handle_reaction_events(payload, add=False)
 
+    async def on_guild_channel_create(self, channel):
+        self.threads.on_channel_create(channel)
+
+    async def on_guild_channel_update(self, before, after):
+        self.threads.on_channel_update(before, after)
+
     async def on_guild_channel_delete(self, channel):
         if channel.guild != self.modmail_guild:
             return
 
+        try:
+            await self._handle_channel_delete(channel)
+        finally:
+            self.threads.on_channel_delete(channel)
+
+    async def _handle_channel_delete(self, channel):
         try:
             audit_logs = self.modmail_guild.audit_logs()
             entry = await audit_logs.find(lambda a: a.target == channel)
@@ -1049,6 +1078,7 @@ class ModmailBot(commands.Bot):
     async def on_member_remove(self, member):
         if member.guild != self.guild:
             return
+        self.invalidate_block_verdict(member.id)
         thread = await self.threads.find(recipient=member)
         if thread:
             embed = discord.Embed(
@@ -1059,6 +1089,7 @@ class ModmailBot(commands.Bot):
     async def on_member_join(self, member):
         if member.guild != self.guild:
             return
+        self.invalidate_block_verdict(member.id)
         thread = await self.threads.find(recipient=member)
         if thread:
             embed = discord.Embed(
@@ -1,6 +1,7 @@
 import asyncio
 import re
 from datetime import datetime
+from functools import partial
 from itertools import zip_longest
 from typing import Optional, Union
 from types import SimpleNamespace
@@ -14,7 +15,8 @@ from natural.date import duration
 
 from core import checks
 from core.models import PermissionLevel, getLogger
-from core.paginator import EmbedPaginatorSession
+from core.paginator import CursorPageSource, EmbedPaginatorSession, SourcePaginatorSession
+from core.stores import BlockList
 from core.thread import Thread
 from core.time import UserFriendlyTime, human_timedelta
 from core.utils import *
@@ -228,7 +230,6 @@ class Modmail(commands.Cog):
             return await ctx.send(embed=embed)
 
         self.bot.snippets[name] = value
-        await self.bot.config.update()
 
         embed = discord.Embed(
             title="Respuesa predefinida añadida",
@@ -249,7 +250,6 @@ class Modmail(commands.Cog):
                 description=f"La respuesta predefinda `{name}` ahora está eliminada.",
             )
             self.bot.snippets.pop(name)
-            await self.bot.config.update()
         else:
             embed = create_not_found_embed(name, self.bot.snippets.keys(), "Respuesta predefinida")
         await ctx.send(embed=embed)
@@ -266,7 +266,6 @@ class Modmail(commands.Cog):
         """
         if name in self.bot.snippets:
             self.bot.snippets[name] = value
-            await self.bot.config.update()
 
             embed = discord.Embed(
                 title="Respuesta predefinida editada",
@@ -410,10 +409,7 @@ class Modmail(commands.Cog):
 
         thread = ctx.thread
 
-        if str(thread.id) not in self.bot.config["notification_squad"]:
-            self.bot.config["notification_squad"][str(thread.id)] = []
-
-        mentions = self.bot.config["notification_squad"][str(thread.id)]
+        mentions = self.bot.stores.notification_squad.get(str(thread.id), [])
 
         if mention in mentions:
             embed = discord.Embed(
@@ -421,8 +417,7 @@ class Modmail(commands.Cog):
                 description=f"{mention} ya va a ser notificado.",
             )
         else:
-            mentions.append(mention)
-            await self.bot.config.update()
+            self.bot.stores.notification_squad[str(thread.id)] = mentions + [mention]
             embed = discord.Embed(
                 color=self.bot.main_color,
                 description=f"{mention} será notificado en el próximo mensaje.",
@@ -448,10 +443,7 @@ class Modmail(commands.Cog):
 
         thread = ctx.thread
 
-        if str(thread.id) not in self.bot.config["notification_squad"]:
-            self.bot.config["notification_squad"][str(thread.id)] = []
-
-        mentions = self.bot.config["notification_squad"][str(thread.id)]
+        mentions = self.bot.stores.notification_squad.get(str(thread.id), [])
 
         if mention not in mentions:
             embed = discord.Embed(
@@ -460,7 +452,10 @@ class Modmail(commands.Cog):
             )
         else:
             mentions.remove(mention)
-            await self.bot.config.update()
+            if mentions:
+                self.bot.stores.notification_squad[str(thread.id)] = mentions
+            else:
+                self.bot.stores.notification_squad.pop(str(thread.id))
             embed = discord.Embed(
                 color=self.bot.main_color, description=f"{mention} ahora no será notificado."
             )
@@ -487,10 +482,7 @@ class Modmail(commands.Cog):
 
         thread = ctx.thread
 
-        if str(thread.id) not in self.bot.config["subscriptions"]:
-            self.bot.config["subscriptions"][str(thread.id)] = []
-
-        mentions = self.bot.config["subscriptions"][str(thread.id)]
+        mentions = self.bot.stores.subscriptions.get(str(thread.id), [])
 
         if mention in mentions:
             embed = discord.Embed(
@@ -498,8 +490,7 @@ class Modmail(commands.Cog):
                 description=f"{mention} ya está subscripto al hilo.",
             )
         else:
-            mentions.append(mention)
-            await self.bot.config.update()
+            self.bot.stores.subscriptions[str(thread.id)] = mentions + [mention]
             embed = discord.Embed(
                 color=self.bot.main_color,
                 description=f"{mention} ahora será notificado de todos los mensajes que lleguen.",
@@ -525,10 +516,7 @@ class Modmail(commands.Cog):
 
         thread = ctx.thread
 
-        if str(thread.id) not in self.bot.config["subscriptions"]:
-            self.bot.config["subscriptions"][str(thread.id)] = []
-
-        mentions = self.bot.config["subscriptions"][str(thread.id)]
+        mentions = self.bot.stores.subscriptions.get(str(thread.id), [])
 
         if mention not in mentions:
             embed = discord.Embed(
@@ -537,7 +525,10 @@ class Modmail(commands.Cog):
             )
         else:
             mentions.remove(mention)
-            await self.bot.config.update()
+            if mentions:
+                self.bot.stores.subscriptions[str(thread.id)] = mentions
+            else:
+                self.bot.stores.subscriptions.pop(str(thread.id))
             embed = discord.Embed(
                 color=self.bot.main_color,
                 description=f"{mention} ahora está dessubscripto a este hilo.",
@@ -570,48 +561,64 @@ class Modmail(commands.Cog):
         log_link = await self.bot.api.get_log_link(ctx.channel.id)
         await ctx.send(embed=discord.Embed(color=self.bot.main_color, description=log_link))
 
-    def format_log_embeds(self, logs, avatar_url):
-        embeds = []
-        logs = tuple(logs)
-        title = f"Resultados encontrados totales ({len(logs)})"
-
-        for entry in logs:
-            created_at = parser.parse(entry["created_at"])
-
-            prefix = self.bot.config["log_url_prefix"].strip("/")
-            if prefix == "NONE":
-                prefix = ""
-            log_url = f"{self.bot.config['log_url'].strip('/')}{'/' + prefix if prefix else ''}/{entry['key']}"
-
-            username = entry["recipient"]["name"] + "#"
-            username += entry["recipient"]["discriminator"]
-
-            embed = discord.Embed(color=self.bot.main_color, timestamp=created_at)
-            embed.set_author(name=f"{title} - {username}", icon_url=avatar_url, url=log_url)
-            embed.url = log_url
-            embed.add_field(name="Creado:", value=duration(created_at, now=datetime.utcnow()))
-            closer = entry.get("closer")
-            if closer is None:
-                closer_msg = "Desconocido"
-            else:
-                closer_msg = f"<@{closer['id']}>"
-            embed.add_field(name="Cerrado por:", value=closer_msg)
+    def format_log_embed(self, entry, avatar_url, title):
+        created_at = parser.parse(entry["created_at"])
 
-            if entry["recipient"]["id"] != entry["creator"]["id"]:
-                embed.add_field(name="Creado por:", value=f"<@{entry['creator']['id']}>")
+        prefix = self.bot.config["log_url_prefix"].strip("/")
+        if prefix == "NONE":
+            prefix = ""
+        log_url = f"{self.bot.config['log_url'].strip('/')}{'/' + prefix if prefix else ''}/{entry['key']}"
 
-            embed.add_field(name="Previsualización:", value=format_preview(entry["messages"]), inline=False)
+        username = entry["recipient"]["name"] + "#"
+        username += entry["recipient"]["discriminator"]
 
-            if closer is not None:
-                # BUG: Currently, logviewer can't display logs without a closer.
-                embed.add_field(name="Enlace:", value=log_url)
-            else:
-                logger.debug("Entrada de registros inválida: no hay un cerrante.")
-                embed.add_field(name="Clave de registros:", value=f"`{entry['key']}`")
+        embed = discord.Embed(color=self.bot.main_color, timestamp=created_at)
+        embed.set_author(name=f"{title} - {username}", icon_url=avatar_url, url=log_url)
+        embed.url = log_url
+        embed.add_field(name="Creado:", value=duration(created_at, now=datetime.utcnow()))
+        closer = entry.get("closer")
+        if closer is None:
+            closer_msg = "Desconocido"
+        else:
+            closer_msg = f"<@{closer['id']}>"
+        embed.add_field(name="Cerrado por:", value=closer_msg)
 
-            embed.set_footer(text="ID del receptor: " + str(entry["recipient"]["id"]))
-            embeds.append(embed)
-        return embeds
+        if entry["recipient"]["id"] != entry["creator"]["id"]:
+            embed.add_field(name="Creado por:", value=f"<@{entry['creator']['id']}>")
+
+        embed.add_field(name="Previsualización:", value=format_preview(entry["messages"]), inline=False)
+
+        if closer is not None:
+            # BUG: Currently, logviewer can't display logs without a closer.
+            embed.add_field(name="Enlace:", value=log_url)
+        else:
+            logger.debug("Entrada de registros inválida: no hay un cerrante.")
+            embed.add_field(name="Clave de registros:", value=f"`{entry['key']}`")
+
+        embed.set_footer(text="ID del receptor: " + str(entry["recipient"]["id"]))
+        return embed
+
+    async def paginate_logs(self, ctx, query, *, avatar_url, sort=None, limit=None, count=None):
+        """Shows the logs matching `query` one page at a time, returns whether there are any."""
+        api = self.bot.api
+        if count is None:
+            count = await api.count_logs(query, limit)
+        if not count:
+            return False
+
+        cursor = api.find_logs(query, sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        title = f"Resultados encontrados totales ({count})"
+        source = CursorPageSource(
+            cursor,
+            count,
+            lambda entry, index, count: self.format_log_embed(entry, avatar_url, title),
+            prepare=partial(api.with_messages, limit=api.preview_size),
+        )
+        session = SourcePaginatorSession(ctx, source)
+        await session.run()
+        return True
 
     @commands.group(invoke_without_command=True)
     @checks.has_permissions(PermissionLevel.SUPPORTER)
@@ -635,21 +642,22 @@ class Modmail(commands.Cog):
         default_avatar = "https://cdn.discordapp.com/embed/avatars/0.png"
         icon_url = getattr(user, "avatar_url", default_avatar)
 
-        logs = await self.bot.api.get_user_logs(user.id)
+        stats = await self.bot.api.get_recipient_stats(user.id)
 
-        if not any(not log["open"] for log in logs):
+        if not stats["closed_count"]:
             embed = discord.Embed(
                 color=self.bot.error_color,
                 description="Este usuario no tiene registros previos.",
             )
             return await ctx.send(embed=embed)
 
-        logs = reversed([log for log in logs if not log["open"]])
-
-        embeds = self.format_log_embeds(logs, avatar_url=icon_url)
-
-        session = EmbedPaginatorSession(ctx, *embeds)
-        await session.run()
+        await self.paginate_logs(
+            ctx,
+            self.bot.api.closed_logs_query(user.id),
+            avatar_url=icon_url,
+            sort=[("closed_at", -1)],
+            count=stats["closed_count"],
+        )
 
     @logs.command(name="closed-by", aliases=["closeby"])
     @checks.has_permissions(PermissionLevel.SUPPORTER)
@@ -662,23 +670,14 @@ class Modmail(commands.Cog):
         """
         user = user if user is not None else ctx.author
 
-        query = {"guild_id": str(self.bot.guild_id), "open": False, "closer.id": str(user.id)}
-
-        projection = {"messages": {"$slice": 5}}
-
-        entries = await self.bot.db.logs.find(query, projection).to_list(None)
+        query = self.bot.api.closed_by_query(user.id)
 
-        embeds = self.format_log_embeds(entries, avatar_url=self.bot.guild.icon_url)
-
-        if not embeds:
+        if not await self.paginate_logs(ctx, query, avatar_url=self.bot.guild.icon_url):
             embed = discord.Embed(
                 color=self.bot.error_color,
                 description="No hay entradas en los registros que coinicidan con esta búsqueda.",
             )
-            return await ctx.send(embed=embed)
-
-        session = EmbedPaginatorSession(ctx, *embeds)
-        await session.run()
+            await ctx.send(embed=embed)
 
     @logs.command(name="delete", aliases=["wipe"])
     @checks.has_permissions(PermissionLevel.OWNER)
@@ -716,19 +715,37 @@ class Modmail(commands.Cog):
         """
         user = user if user is not None else ctx.author
 
-        entries = await self.bot.api.get_responded_logs(user.id)
+        query = self.bot.api.responded_query(user.id)
 
-        embeds = self.format_log_embeds(entries, avatar_url=self.bot.guild.icon_url)
-
-        if not embeds:
+        if not await self.paginate_logs(ctx, query, avatar_url=self.bot.guild.icon_url):
             embed = discord.Embed(
                 color=self.bot.error_color,
                 description=f"{getattr(user, 'mention', user.id)} no ha respondido a ningún hilo.",
             )
-            return await ctx.send(embed=embed)
+            await ctx.send(embed=embed)
 
-        session = EmbedPaginatorSession(ctx, *embeds)
-        await session.run()
+    @logs.command(name="stats")
+    @checks.has_permissions(PermissionLevel.SUPPORTER)
+    async def logs_stats(self, ctx, *, user: User = None):
+        """
+        Get how many threads the specified user has responded to, and with how many messages.
+
+        If no `user` is provided, the user will be the person who sent this command.
+        `user` may be a user ID, mention, or name.
+        """
+        user = user if user is not None else ctx.author
+
+        await ctx.trigger_typing()
+
+        stats = await self.bot.api.get_mod_stats(user.id)
+        threads = "hilo" if stats["threads"] == 1 else "hilos"
+        messages = "mensaje" if stats["messages"] == 1 else "mensajes"
+        embed = discord.Embed(
+            color=self.bot.main_color,
+            description=f"{getattr(user, 'mention', user.id)} ha respondido a "
+            f"**{stats['threads']}** {threads} cerrados con **{stats['messages']}** {messages}.",
+        )
+        await ctx.send(embed=embed)
 
     @logs.command(name="search", aliases=["find"])
     @checks.has_permissions(PermissionLevel.SUPPORTER)
@@ -741,27 +758,17 @@ class Modmail(commands.Cog):
 
         await ctx.trigger_typing()
 
-        query = {
-            "guild_id": str(self.bot.guild_id),
-            "open": False,
-            "$text": {"$search": f'"{query}"'},
-        }
+        query = await self.bot.api.search_query(query, limit)
 
-        projection = {"messages": {"$slice": 5}}
-
-        entries = await self.bot.db.logs.find(query, projection).to_list(limit)
-
-        embeds = self.format_log_embeds(entries, avatar_url=self.bot.guild.icon_url)
-
-        if not embeds:
+        found = await self.paginate_logs(
+            ctx, query, avatar_url=self.bot.guild.icon_url, limit=limit
+        )
+        if not found:
             embed = discord.Embed(
                 color=self.bot.error_color,
                 description="No hay entradas en los registros que coincidan con esa búsqueda.",
             )
-            return await ctx.send(embed=embed)
-
-        session = EmbedPaginatorSession(ctx, *embeds)
-        await session.run()
+            await ctx.send(embed=embed)
 
     @commands.command()
     @checks.has_permissions(PermissionLevel.SUPPORTER)
@@ -883,13 +890,16 @@ class Modmail(commands.Cog):
             )
             return await ctx.send(embed=embed)
 
-        exists = await self.bot.threads.find(recipient=user)
+        # the thread may still be waiting in line or being set up
+        exists = self.bot.threads.get_pending(user.id) or await self.bot.threads.find(
+            recipient=user
+        )
         if exists:
-            embed = discord.Embed(
-                color=self.bot.error_color,
-                description="Un hilo con este usuario "
-                f"existe en {exists.channel.mention}.",
-            )
+            if exists.channel is None:
+                description = "Ya se está creando un hilo con este usuario."
+            else:
+                description = f"Un hilo con este usuario existe en {exists.channel.mention}."
+            embed = discord.Embed(color=self.bot.error_color, description=description)
             await ctx.channel.send(embed=embed)
 
         else:
@@ -919,7 +929,8 @@ class Modmail(commands.Cog):
 
         users = []
 
-        for id_, reason in self.bot.blocked_users.items():
+        for id_, record in self.bot.blocked_users.items():
+            reason = BlockList.describe(record)
             user = self.bot.get_user(int(id_))
             if user:
                 users.append((user.mention, reason))
@@ -967,7 +978,7 @@ class Modmail(commands.Cog):
                 return await ctx.send_help(ctx.command)
 
         mention = getattr(user, "mention", f"`{user.id}`")
-        msg = ""
+        record = None
 
         if str(user.id) in self.bot.blocked_whitelisted_users:
             embed = discord.Embed(
@@ -975,21 +986,23 @@ class Modmail(commands.Cog):
                 description=f"{mention} ya no está en la lista blanca.",
                 color=self.bot.main_color,
             )
-            self.bot.blocked_whitelisted_users.remove(str(user.id))
+            self.bot.config["blocked_whitelist"] = [
+                id_ for id_ in self.bot.blocked_whitelisted_users if id_ != str(user.id)
+            ]
+            await self.bot.config.update()
             return await ctx.send(embed=embed)
 
-        self.bot.blocked_whitelisted_users.append(str(user.id))
+        self.bot.config["blocked_whitelist"] = self.bot.blocked_whitelisted_users + [str(user.id)]
 
         if str(user.id) in self.bot.blocked_users:
-            msg = self.bot.blocked_users.get(str(user.id)) or ""
-            self.bot.blocked_users.pop(str(user.id))
+            record = self.bot.blocked_users.pop(str(user.id))
 
         await self.bot.config.update()
 
-        if msg.startswith("System Message: "):
+        if record is not None and record["source"] != "manual":
             # If the user is blocked internally (for example: below minimum account age)
             # Show an extended message stating the original internal message
-            reason = msg[16:].strip().rstrip(".")
+            reason = record["reason"].strip().rstrip(".")
             embed = discord.Embed(
                 title="Correcto",
                 description=f"{mention} fue previamente bloqueado internamente por "
@@ -1040,23 +1053,20 @@ class Modmail(commands.Cog):
             return await ctx.send(embed=embed)
 
         reason = f"Por {escape_markdown(ctx.author.name)}#{ctx.author.discriminator}"
+        expires_at = None
 
         if after is not None:
-            if "%" in reason:
-                raise commands.BadArgument('La razón contiene un caracter ilegal ("%").')
             if after.arg:
                 reason += f" por `{after.arg}`"
             if after.dt > after.now:
-                reason += f" hasta {after.dt.isoformat()}"
+                expires_at = after.dt
 
-        reason += "."
+        old_reason = BlockList.describe(self.bot.blocked_users.active(user.id))
+        record = self.bot.blocked_users.block(user.id, reason, expires_at=expires_at)
+        reason = BlockList.describe(record)
 
-        msg = self.bot.blocked_users.get(str(user.id))
-        if msg is None:
-            msg = ""
-
-        if str(user.id) in self.bot.blocked_users and msg:
-            old_reason = msg.strip().rstrip(".")
+        if old_reason:
+            old_reason = old_reason.strip().rstrip(".")
             embed = discord.Embed(
                 title="Correcto",
                 description=f"{mention} que fue previamente bloqueado por {old_reason}.\n"
@@ -1069,8 +1079,6 @@ class Modmail(commands.Cog):
                 color=self.bot.main_color,
                 description=f"{mention} ahoar está bloqueado por {reason}",
             )
-        self.bot.blocked_users[str(user.id)] = reason
-        await self.bot.config.update()
 
         return await ctx.send(embed=embed)
 
@@ -1097,13 +1105,12 @@ class Modmail(commands.Cog):
         name = getattr(user, "name", f"`{user.id}`")
 
         if str(user.id) in self.bot.blocked_users:
-            msg = self.bot.blocked_users.pop(str(user.id)) or ""
-            await self.bot.config.update()
+            record = self.bot.blocked_users.pop(str(user.id))
 
-            if msg.startswith("System Message: "):
+            if record["source"] != "manual":
                 # If the user is blocked internally (for example: below minimum account age)
                 # Show an extended message stating the original internal message
-                reason = msg[16:].strip().rstrip(".") or "sin razón"
+                reason = record["reason"].strip().rstrip(".") or "sin razón"
                 embed = discord.Embed(
                     title="Correcto",
                     description=f"{mention} que fue previamente bloqueado internamente por {reason}.\n"
@@ -1175,13 +1182,10 @@ class Modmail(commands.Cog):
         logger.info("Intentando arreglar un hilo roto %s.", ctx.channel.name)
 
         # Search cache for channel
-        user_id, thread = next(
-            ((k, v) for k, v in self.bot.threads.cache.items() if v.channel == ctx.channel),
-            (-1, None),
-        )
+        thread = self.bot.threads.channel_cache.get(ctx.channel.id)
         if thread is not None:
             logger.debug("Encontrado un hilo con la ID moderada.")
-            await ctx.channel.edit(reason="Arreglando hilo roto", topic=f"ID del usuario: {user_id}")
+            await ctx.channel.edit(reason="Arreglando hilo roto", topic=f"ID del usuario: {thread.id}")
             return await self.bot.add_reaction(ctx.message, sent_emoji)
 
         # find genesis message to retrieve User ID
@@ -1197,13 +1201,10 @@ class Modmail(commands.Cog):
                 if user_id != -1:
                     recipient = self.bot.get_user(user_id)
                     if recipient is None:
-                        self.bot.threads.cache[user_id] = thread = Thread(
-                            self.bot.threads, user_id, ctx.channel
-                        )
+                        thread = Thread(self.bot.threads, user_id, ctx.channel)
                     else:
-                        self.bot.threads.cache[user_id] = thread = Thread(
-                            self.bot.threads, recipient, ctx.channel
-                        )
+                        thread = Thread(self.bot.threads, recipient, ctx.channel)
+                    self.bot.threads.register(thread)
                     thread.ready = True
                     logger.info(
                         "Estableciendo la descripciión del canal actual a la ID del usuario y creando nuevo hilo..."
@@ -1249,14 +1250,13 @@ class Modmail(commands.Cog):
                             await thread.channel.send(embed=embed)
                         except discord.HTTPException:
                             pass
+                if user.id in self.bot.threads.cache:
+                    self.bot.threads.unregister(self.bot.threads.cache[user.id])
                 if recipient is None:
-                    self.bot.threads.cache[user.id] = thread = Thread(
-                        self.bot.threads, user_id, ctx.channel
-                    )
+                    thread = Thread(self.bot.threads, user.id, ctx.channel)
                 else:
-                    self.bot.threads.cache[user.id] = thread = Thread(
-                        self.bot.threads, recipient, ctx.channel
-                    )
+                    thread = Thread(self.bot.threads, recipient, ctx.channel)
+                self.bot.threads.register(thread)
                 thread.ready = True
                 logger.info("Estableciendo la descripción del canal a la ID del usuario y creando nuevo hilo...")
                 await ctx.channel.edit(
@@ -179,7 +179,6 @@ class ModmailHelpCommand(commands.HelpCommand):
                 )
                 embed.add_field(name=f"{command}` era:", value=val)
                 self.context.bot.aliases.pop(command)
-                await self.context.bot.config.update()
             else:
                 if len(values) == 1:
                     embed = discord.Embed(
@@ -432,6 +431,65 @@ class Utility(commands.Cog):
             )
         )
 
+    @debug.command(name="metrics", aliases=["stats"])
+    @checks.has_permissions(PermissionLevel.OWNER)
+    async def debug_metrics(self, ctx):
+        """Shows the queues, latencies and database writes of the bot."""
+
+        threads = self.bot.threads
+        embed = discord.Embed(title="Métricas", color=self.bot.main_color)
+        embed.add_field(
+            name="Creación de hilos",
+            value=f"En la fila: {threads.queue_depth}\n"
+            f"Mensajes en espera (máx.): {threads.max_pending_messages}\n"
+            f"Mensajes descartados: {threads.dropped_messages}",
+        )
+
+        pool = threads.channel_pool.metrics()
+        embed.add_field(
+            name="Canales de reserva",
+            value=f"Disponibles: {pool['size']}\n"
+            f"Aciertos: {pool['hits']} ({pool['hit_rate']:.0%})\n"
+            f"Creación: {pool['pooled_latency'] * 1000:.0f} ms con reserva, "
+            f"{pool['created_latency'] * 1000:.0f} ms sin ella",
+        )
+
+        writer = self.bot.api.log_writer.metrics()
+        embed.add_field(
+            name="Registros",
+            value=f"Mensajes pendientes: {writer['pending']}\n"
+            f"Escrituras: {writer['batches']} "
+            f"(media de {writer['average_batch_size']:.1f} mensajes)\n"
+            f"Latencia: {writer['average_flush_latency'] * 1000:.0f} ms, "
+            f"máx. {writer['max_flush_latency'] * 1000:.0f} ms",
+        )
+
+        config = self.bot.config
+        embed.add_field(
+            name="Configuración",
+            value=f"Escrituras: {config.writes}\n"
+            f"Actualizaciones combinadas: {config.coalesced_updates}",
+        )
+
+        # the busiest threads first
+        relays = sorted(
+            threads.relay_metrics().items(),
+            key=lambda item: (item[1]["queue_depth"], item[1]["max_latency"]),
+            reverse=True,
+        )
+        lines = [
+            f"<@{recipient_id}>: {metrics['queue_depth']} en cola, "
+            f"{metrics['average_latency'] * 1000:.0f} ms de media, "
+            f"máx. {metrics['max_latency'] * 1000:.0f} ms"
+            for recipient_id, metrics in relays[:10]
+        ]
+        embed.add_field(
+            name=f"Envío de mensajes ({len(relays)} hilos)",
+            value="\n".join(lines) or "No hay hilos abiertos.",
+            inline=False,
+        )
+        await ctx.send(embed=embed)
+
     @commands.command(aliases=["presence"])
     @checks.has_permissions(PermissionLevel.ADMINISTRATOR)
     async def activity(self, ctx, activity_type: str.lower, *, message: str = ""):
@@ -883,7 +941,6 @@ class Utility(commands.Cog):
                 )
                 embed.add_field(name=f"{name}` era: ", value=utils.truncate(val, 1024))
                 self.bot.aliases.pop(name)
-                await self.bot.config.update()
                 return await ctx.send(embed=embed)
 
             if len(values) == 1:
@@ -999,7 +1056,6 @@ class Utility(commands.Cog):
                 embed.add_field(name=f"Paso {i}:", value=utils.truncate(val, 1024))
 
         self.bot.aliases[name] = " && ".join(f'"{a}"' for a in save_aliases)
-        await self.bot.config.update()
         return embed
 
     @alias.command(name="add")
@@ -1058,7 +1114,6 @@ class Utility(commands.Cog):
 
         if name in self.bot.aliases:
             self.bot.aliases.pop(name)
-            await self.bot.config.update()
 
             embed = discord.Embed(
                 title="Alias removido",
@@ -1,4 +1,8 @@
+import asyncio
+import hashlib
 import secrets
+import time
+from collections import defaultdict
 from datetime import datetime
 from json import JSONDecodeError
 from typing import Union
@@ -6,11 +10,16 @@ from typing import Union
 from discord import Member, DMChannel, TextChannel, Message
 
 from aiohttp import ClientResponseError, ClientResponse
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
 
 from core.models import getLogger
 
 logger = getLogger(__name__)
 
+# the messages that count as a mod responding to a thread
+RESPONSE_TYPES = ["anonymous", "thread_message"]
+
 
 class RequestClient:
     """
@@ -75,7 +84,322 @@ class RequestClient:
                 return await resp.text()
 
 
+def to_message_document(key: str, message: dict) -> tuple:
+    """
+    Converts a logged message to its `log_messages` document.
+
+    Parameters
+    ----------
+    key : str
+        The key of the log.
+    message : Dict[str, Any]
+        The message as it's embedded in the log, with its `seq`.
+
+    Returns
+    -------
+    Tuple[Dict[str, Any], str, Dict[str, Any]]
+        The document, the reference to its author and the author's profile.
+    """
+    author = message.get("author") or {}
+    profile = {
+        "id": str(author.get("id")),
+        "name": author.get("name"),
+        "discriminator": author.get("discriminator"),
+        "avatar_url": author.get("avatar_url"),
+    }
+    ref = hashlib.sha1("\0".join(map(str, profile.values())).encode()).hexdigest()[:16]
+
+    document = {k: v for k, v in message.items() if k not in {"author", "seq"}}
+    document.update(
+        {
+            "_id": f"{key}-{message['seq']}",
+            "log_key": key,
+            "seq": message["seq"],
+            "author": ref,
+            "author_id": profile["id"],
+            "mod": author.get("mod", False),
+        }
+    )
+    return document, ref, profile
+
+
+def from_message_document(document: dict, profile: dict) -> dict:
+    """Converts a `log_messages` document back to the message embedded in a log."""
+    message = {
+        k: v
+        for k, v in document.items()
+        if k not in {"_id", "log_key", "seq", "author", "author_id", "mod"}
+    }
+    message["author"] = {
+        "id": document["author_id"],
+        "name": profile.get("name"),
+        "discriminator": profile.get("discriminator"),
+        "avatar_url": profile.get("avatar_url"),
+        "mod": document["mod"],
+    }
+    return message
+
+
+def count_participants(messages) -> dict:
+    """Counts the responses of each mod in `messages`, by ID."""
+    counts = {}
+    for message in messages:
+        author = message.get("author") or {}
+        if author.get("mod") and message.get("type") in RESPONSE_TYPES:
+            author_id = str(author["id"])
+            counts[author_id] = counts.get(author_id, 0) + 1
+    return counts
+
+
+def participants_update(counts: dict) -> dict:
+    """The update operators adding `counts` to the participants of a log."""
+    if not counts:
+        return {}
+    return {
+        "$addToSet": {"participant_ids": {"$each": list(counts)}},
+        "$inc": {f"participants.{author_id}": count for author_id, count in counts.items()},
+    }
+
+
+class LogWriter:
+    """
+    Saves the thread messages to the logs in batches.
+
+    Messages are buffered per channel and written with a single
+    `bulk_write` once `log_batch_size` messages are waiting or
+    `log_flush_interval` seconds passed, whichever comes first.
+    The messages of logs using the schema 2 are numbered and
+    inserted in `log_messages` instead.
+
+    Parameters
+    ----------
+    bot : Bot
+        The Modmail bot.
+
+    Attributes
+    ----------
+    batches : int
+        The number of writes.
+    messages : int
+        The number of messages written.
+    max_batch_size : int
+        The most messages written at once.
+    flush_latency : float
+        The total time spent writing, in seconds.
+    max_flush_latency : float
+        The longest write, in seconds.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        # channel id -> messages waiting to be written
+        self._buffers = {}
+        # channel id -> key, schema and last sequence of its log
+        self._targets = {}
+        self._pending = 0
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+        self.batches = 0
+        self.messages = 0
+        self.max_batch_size = 0
+        self.flush_latency = 0.0
+        self.max_flush_latency = 0.0
+
+    def __len__(self):
+        return self._pending
+
+    def _setting(self, key: str) -> float:
+        try:
+            return max(float(self.bot.config[key]), 0)
+        except (TypeError, ValueError):
+            logger.warning("Inválido %s, usando el valor por defecto.", key)
+            return float(self.bot.config.remove(key))
+
+    @property
+    def batch_size(self) -> int:
+        return max(int(self._setting("log_batch_size")), 1)
+
+    @property
+    def interval(self) -> float:
+        return self._setting("log_flush_interval")
+
+    def metrics(self) -> dict:
+        return {
+            "pending": self._pending,
+            "batches": self.batches,
+            "average_batch_size": self.messages / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "average_flush_latency": self.flush_latency / self.batches if self.batches else 0.0,
+            "max_flush_latency": self.max_flush_latency,
+        }
+
+    def track(self, channel_id: str, key: str, schema: int = 1, seq: int = 0) -> None:
+        """Remembers the log of a channel, so it's not looked up on the first write."""
+        self._targets[str(channel_id)] = {"key": key, "schema": schema, "seq": seq}
+
+    def forget(self, channel_id: str) -> None:
+        self._targets.pop(str(channel_id), None)
+
+    def append(self, channel_id: str, data: dict) -> None:
+        self._buffers.setdefault(channel_id, []).append(data)
+        self._pending += 1
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = self.bot.loop.create_task(self._delayed_flush())
+        elif self._pending >= self.batch_size:
+            # don't wait for the interval, the batch is full
+            self.bot.loop.create_task(self._background_flush())
+
+    async def _delayed_flush(self) -> None:
+        if self._pending < self.batch_size:
+            await asyncio.sleep(self.interval)
+        try:
+            # messages appended while writing are picked up by the next round
+            while self._pending:
+                await self.flush()
+        except Exception:
+            logger.error("Fallo al guardar los mensajes en los registros.", exc_info=True)
+
+    async def _background_flush(self) -> None:
+        try:
+            await self.flush()
+        except Exception:
+            logger.error("Fallo al guardar los mensajes en los registros.", exc_info=True)
+
+    async def flush(self) -> None:
+        """Writes every buffered message right away."""
+        async with self._flush_lock:
+            buffers, self._buffers = self._buffers, {}
+            count, self._pending = self._pending, 0
+            if not buffers:
+                return
+
+            start = time.perf_counter()
+            try:
+                await self._write(buffers)
+            except Exception:
+                # keep the ones that weren't written, in order, for the next write
+                for channel_id, messages in buffers.items():
+                    self._buffers[channel_id] = messages + self._buffers.get(channel_id, [])
+                    self._pending += len(messages)
+                raise
+
+            latency = time.perf_counter() - start
+            self.batches += 1
+            self.messages += count
+            self.max_batch_size = max(self.max_batch_size, count)
+            self.flush_latency += latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+
+    async def _resolve(self, channel_ids) -> None:
+        unknown = [channel_id for channel_id in channel_ids if channel_id not in self._targets]
+        if not unknown:
+            return
+        projection = {"channel_id": True, "key": True, "schema": True, "message_count": True}
+        async for log in self.bot.api.logs.find({"channel_id": {"$in": unknown}}, projection):
+            self.track(
+                log["channel_id"], log["key"], log.get("schema", 1), log.get("message_count", 0)
+            )
+
+    async def _write(self, buffers: dict) -> None:
+        """
+        Writes `buffers`, the channels that were written are removed from it.
+
+        The log updates (`$push`, `$inc`) can't be retried, so only the
+        channels whose update failed are left for the next write. The
+        messages of schema 2 logs are inserted first, a retry skips the
+        ones that already exist.
+        """
+        api = self.bot.api
+        await self._resolve(buffers)
+
+        log_ops = []
+        # the channel of each operation of `log_ops`
+        op_channels = []
+        documents = []
+        authors = {}
+        for channel_id, messages in list(buffers.items()):
+            target = self._targets.get(channel_id)
+            if target is None:
+                logger.warning(
+                    "No se encontró el registro del canal %s, %d mensajes descartados.",
+                    channel_id,
+                    len(messages),
+                )
+                del buffers[channel_id]
+                continue
+
+            participants = participants_update(count_participants(messages))
+            op_channels.append(channel_id)
+            if target["schema"] != 2:
+                log_ops.append(
+                    UpdateOne(
+                        {"channel_id": channel_id},
+                        {"$push": {"messages": {"$each": messages}}, **participants},
+                    )
+                )
+                continue
+
+            for message in messages:
+                # a retried message keeps its sequence
+                if "seq" not in message:
+                    target["seq"] += 1
+                    message["seq"] = target["seq"]
+                document, ref, profile = to_message_document(target["key"], message)
+                documents.append(document)
+                authors[ref] = profile
+            log_ops.append(
+                UpdateOne(
+                    {"key": target["key"]},
+                    {"$max": {"message_count": target["seq"]}, **participants},
+                )
+            )
+
+        if authors:
+            await api.intern_authors(authors)
+        if documents:
+            await api.insert_log_messages(documents)
+        if not log_ops:
+            return
+
+        try:
+            await api.logs.bulk_write(log_ops, ordered=False)
+        except BulkWriteError as e:
+            details = e.details or {}
+            failed = {op_channels[error["index"]] for error in details.get("writeErrors", [])}
+            for channel_id in op_channels:
+                if channel_id not in failed:
+                    del buffers[channel_id]
+            raise
+        buffers.clear()
+
+
 class ApiClient(RequestClient):
+    # how many interned authors are remembered before starting over
+    max_interned_authors = 10000
+    # how many messages of each log are loaded for the previews
+    preview_size = 5
+    # how many logs with matching messages a search looks at, newest first
+    max_search_keys = 1000
+
+    # the fields of the logs shown in the log embeds
+    summary_projection = {
+        "key": True,
+        "schema": True,
+        "created_at": True,
+        "closed_at": True,
+        "recipient": True,
+        "creator": True,
+        "closer": True,
+        "messages": {"$slice": preview_size},
+    }
+
+    def __init__(self, bot):
+        super().__init__(bot)
+        self.log_writer = LogWriter(bot)
+        self._interned = set()
+        # whether every log has its participants, see `index_participants`
+        self.participants_indexed = False
+
     @property
     def db(self):
         return self.bot.db
@@ -84,32 +408,260 @@ class ApiClient(RequestClient):
     def logs(self):
         return self.db.logs
 
-    async def get_user_logs(self, user_id: Union[str, int]) -> list:
+    @property
+    def log_messages(self):
+        return self.db.log_messages
+
+    @property
+    def log_authors(self):
+        return self.db.log_authors
+
+    @property
+    def recipient_stats(self):
+        return self.db.recipient_stats
+
+    @property
+    def log_schema(self) -> int:
+        """The schema of new logs, 2 stores their messages in `log_messages`."""
+        try:
+            schema = int(self.bot.config["log_schema"])
+        except (TypeError, ValueError):
+            schema = None
+        if schema not in {1, 2}:
+            logger.warning("Inválido log_schema, usando el valor por defecto.")
+            schema = int(self.bot.config.remove("log_schema"))
+        return schema
+
+    async def intern_authors(self, authors: dict) -> None:
+        """Saves the author profiles that aren't in `log_authors` yet."""
+        new = {ref: profile for ref, profile in authors.items() if ref not in self._interned}
+        if not new:
+            return
+        await self.log_authors.bulk_write(
+            [
+                UpdateOne({"_id": ref}, {"$setOnInsert": profile}, upsert=True)
+                for ref, profile in new.items()
+            ],
+            ordered=False,
+        )
+        if len(self._interned) + len(new) > self.max_interned_authors:
+            self._interned.clear()
+        self._interned.update(new)
+
+    async def insert_log_messages(self, documents: list) -> None:
+        try:
+            await self.log_messages.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            # the ones that already exist were written by a previous attempt
+            details = e.details or {}
+            if details.get("writeConcernErrors") or any(
+                error.get("code") != 11000 for error in details.get("writeErrors", [])
+            ):
+                raise
+
+    async def with_messages(self, logs: list, limit: int = None) -> list:
+        """
+        Loads the messages of the logs stored with the schema 2.
+
+        Parameters
+        ----------
+        logs : List[Dict[str, Any]]
+            The logs, the ones using the schema 1 are left as they are.
+        limit : int, optional
+            Only load the first `limit` messages of each log.
+
+        Returns
+        -------
+        List[Dict[str, Any]]
+            The same logs.
+        """
+        keys = [log["key"] for log in logs if log.get("schema") == 2]
+        if not keys:
+            return logs
+
+        query = {"log_key": {"$in": keys}}
+        if limit is not None:
+            query["seq"] = {"$lte": limit}
+        documents = (
+            await self.log_messages.find(query).sort([("log_key", 1), ("seq", 1)]).to_list(None)
+        )
+        refs = list({document["author"] for document in documents})
+        profiles = {
+            profile["_id"]: profile
+            async for profile in self.log_authors.find({"_id": {"$in": refs}})
+        }
+
+        messages = defaultdict(list)
+        for document in documents:
+            profile = profiles.get(document["author"], {})
+            messages[document["log_key"]].append(from_message_document(document, profile))
+        for log in logs:
+            if log.get("schema") == 2:
+                log["messages"] = messages[log["key"]]
+        return logs
+
+    async def _with_message(self, log: dict, limit: int = None) -> dict:
+        if log is not None:
+            await self.with_messages([log], limit)
+        return log
+
+    async def get_user_log_count(self, user_id: Union[str, int]) -> int:
+        """The number of closed threads of a user."""
+        stats = await self.get_recipient_stats(user_id)
+        return stats["closed_count"]
+
+    def _stats_query(self, user_id: Union[str, int]) -> dict:
+        return {"guild_id": str(self.bot.guild_id), "recipient_id": str(user_id)}
+
+    async def get_recipient_stats(self, user_id: Union[str, int]) -> dict:
+        """
+        The summary of the threads of a user.
+
+        It's kept up to date when threads are created, closed and deleted,
+        and built from the logs the first time it's needed.
+
+        Parameters
+        ----------
+        user_id : Union[str, int]
+            The ID of the recipient.
+
+        Returns
+        -------
+        Dict[str, Any]
+            `closed_count`, `last_closed_at` and `last_key` of the last closed thread,
+            `open_key` and `open_channel_id` of the open thread (or `None`).
+        """
+        stats = await self.recipient_stats.find_one(self._stats_query(user_id))
+        if stats is None:
+            stats = await self.refresh_recipient_stats(user_id, overwrite=False)
+        return stats
+
+    async def refresh_recipient_stats(
+        self, user_id: Union[str, int], overwrite: bool = True
+    ) -> dict:
+        """Builds the summary of the threads of a user from the logs."""
         query = {"recipient.id": str(user_id), "guild_id": str(self.bot.guild_id)}
-        projection = {"messages": {"$slice": 5}}
-        logger.debug("Recuperando registros %s.", user_id)
+        closed_count, last_log, open_log = await asyncio.gather(
+            self.logs.count_documents({**query, "open": False}),
+            self.logs.find_one(
+                {**query, "open": False},
+                {"key": True, "closed_at": True},
+                sort=[("closed_at", -1)],
+            ),
+            self.logs.find_one({**query, "open": True}, {"key": True, "channel_id": True}),
+        )
+        stats = {
+            "closed_count": closed_count,
+            "last_closed_at": last_log and last_log["closed_at"],
+            "last_key": last_log and last_log["key"],
+            "open_key": open_log and open_log["key"],
+            "open_channel_id": open_log and open_log["channel_id"],
+        }
+        # don't overwrite a summary created meanwhile
+        update = {"$set" if overwrite else "$setOnInsert": stats}
+        return await self.recipient_stats.find_one_and_update(
+            self._stats_query(user_id), update, upsert=True, return_document=True
+        )
 
-        return await self.logs.find(query, projection).to_list(None)
+    async def _update_recipient_stats(self, user_id: Union[str, int], update: dict) -> None:
+        try:
+            result = await self.recipient_stats.update_one(self._stats_query(user_id), update)
+            if not result.matched_count:
+                # the logs already include this change
+                await self.refresh_recipient_stats(user_id, overwrite=False)
+        except Exception:
+            logger.error("Fallo al actualizar el resumen del usuario %s.", user_id, exc_info=True)
 
     async def get_latest_user_logs(self, user_id: Union[str, int]):
         query = {"recipient.id": str(user_id), "guild_id": str(self.bot.guild_id), "open": False}
         projection = {"messages": {"$slice": 5}}
         logger.debug("Recuperando últimos registros %s.", user_id)
 
-        return await self.logs.find_one(query, projection, limit=1, sort=[("closed_at", -1)])
+        log = await self.logs.find_one(query, projection, limit=1, sort=[("closed_at", -1)])
+        return await self._with_message(log, self.preview_size)
+
+    def find_logs(self, query: dict, sort: list = None):
+        """
+        A cursor over the logs matching `query`, with the fields shown in the log embeds.
+
+        The first messages of the schema 2 logs are loaded with `with_messages`.
+        """
+        return self.logs.find(query, self.summary_projection, sort=sort)
+
+    async def count_logs(self, query: dict, limit: int = None) -> int:
+        options = {"limit": limit} if limit else {}
+        return await self.logs.count_documents(query, **options)
+
+    def closed_logs_query(self, user_id: Union[str, int]) -> dict:
+        return {"recipient.id": str(user_id), "guild_id": str(self.bot.guild_id), "open": False}
+
+    def closed_by_query(self, user_id: Union[str, int]) -> dict:
+        return {"guild_id": str(self.bot.guild_id), "open": False, "closer.id": str(user_id)}
+
+    async def search_query(self, text: str, limit: int = None) -> dict:
+        """
+        The closed logs with messages that contain `text`.
+
+        Only the `limit` (at most `max_search_keys`) logs with the newest
+        matching messages are considered for the messages stored with the schema 2.
+        """
+        search = {"$text": {"$search": f'"{text}"'}}
+        query = {"guild_id": str(self.bot.guild_id), "open": False}
+
+        # messages stored with the schema 2
+        pipeline = [
+            {"$match": search},
+            # `str(datetime)` timestamps sort chronologically
+            {"$group": {"_id": "$log_key", "last": {"$max": "$timestamp"}}},
+            {"$sort": {"last": -1}},
+            {"$limit": min(limit or self.max_search_keys, self.max_search_keys)},
+        ]
+        keys = [doc["_id"] async for doc in self.log_messages.aggregate(pipeline)]
+        if keys:
+            return {**query, "$or": [search, {"key": {"$in": keys}}]}
+        return {**query, **search}
 
-    async def get_responded_logs(self, user_id: Union[str, int]) -> list:
-        query = {
-            "open": False,
+    def responded_query(self, user_id: Union[str, int]) -> dict:
+        """The closed logs where the user responded."""
+        query = {"guild_id": str(self.bot.guild_id), "open": False}
+        if self.participants_indexed:
+            return {**query, "participant_ids": str(user_id)}
+
+        # the logs `index_participants` didn't get to yet
+        legacy = {
+            "participants_counted": {"$exists": False},
             "messages": {
                 "$elemMatch": {
                     "author.id": str(user_id),
                     "author.mod": True,
-                    "type": {"$in": ["anonymous", "thread_message"]},
+                    "type": {"$in": RESPONSE_TYPES},
                 }
             },
         }
-        return await self.logs.find(query).to_list(None)
+        return {**query, "$or": [{"participant_ids": str(user_id)}, legacy]}
+
+    async def get_mod_stats(self, user_id: Union[str, int]) -> dict:
+        """The number of closed threads a mod responded to, and of responses."""
+        pipeline = [
+            {
+                "$match": {
+                    "guild_id": str(self.bot.guild_id),
+                    "open": False,
+                    "participant_ids": str(user_id),
+                }
+            },
+            {
+                "$group": {
+                    "_id": None,
+                    "threads": {"$sum": 1},
+                    "messages": {"$sum": f"$participants.{user_id}"},
+                }
+            },
+        ]
+        result = await self.logs.aggregate(pipeline).to_list(1)
+        if not result:
+            return {"threads": 0, "messages": 0}
+        return {"threads": result[0]["threads"], "messages": result[0]["messages"]}
 
     async def get_open_logs(self) -> list:
         query = {"open": True}
@@ -117,10 +669,11 @@ class ApiClient(RequestClient):
 
     async def get_log(self, channel_id: Union[str, int]) -> dict:
         logger.debug("Recuperando canal de registros %s.", channel_id)
-        return await self.logs.find_one({"channel_id": str(channel_id)})
+        log = await self.logs.find_one({"channel_id": str(channel_id)})
+        return await self._with_message(log)
 
     async def get_log_link(self, channel_id: Union[str, int]) -> str:
-        doc = await self.get_log(channel_id)
+        doc = await self.logs.find_one({"channel_id": str(channel_id)}, {"key": True})
         logger.debug("Recuperando enlaces de registros %s.", channel_id)
         prefix = self.bot.config["log_url_prefix"].strip("/")
         if prefix == "NONE":
@@ -133,6 +686,7 @@ class ApiClient(RequestClient):
         self, recipient: Member, channel: TextChannel, creator: Member
     ) -> str:
         key = secrets.token_hex(6)
+        schema = self.log_schema
 
         await self.logs.insert_one(
             {
@@ -160,8 +714,17 @@ class ApiClient(RequestClient):
                 },
                 "closer": None,
                 "messages": [],
+                "schema": schema,
+                "message_count": 0,
+                "participant_ids": [],
+                "participants": {},
+                "participants_counted": True,
             }
         )
+        self.log_writer.track(channel.id, key, schema)
+        await self._update_recipient_stats(
+            recipient.id, {"$set": {"open_key": key, "open_channel_id": str(channel.id)}}
+        )
         logger.debug("Creada una entrada de registros %s.", key)
         prefix = self.bot.config["log_url_prefix"].strip("/")
         if prefix == "NONE":
@@ -169,8 +732,14 @@ class ApiClient(RequestClient):
         return f"{self.bot.config['log_url'].strip('/')}{'/' + prefix if prefix else ''}/{key}"
 
     async def delete_log_entry(self, key: str) -> bool:
-        result = await self.logs.delete_one({"key": key})
-        return result.deleted_count == 1
+        log = await self.logs.find_one_and_delete({"key": key}, {"recipient.id": True})
+        if log is None:
+            return False
+        await asyncio.gather(
+            self.log_messages.delete_many({"log_key": key}),
+            self.refresh_recipient_stats(log["recipient"]["id"]),
+        )
+        return True
 
     async def get_config(self) -> dict:
         conf = await self.db.config.find_one({"bot_id": self.bot.user.id})
@@ -180,26 +749,38 @@ class ApiClient(RequestClient):
             return {"bot_id": self.bot.user.id}
         return conf
 
-    async def update_config(self, data: dict):
-        toset = self.bot.config.filter_valid(data)
-        unset = self.bot.config.filter_valid(
-            {k: 1 for k in self.bot.config.all_keys if k not in data}
-        )
-
-        if toset and unset:
-            return await self.db.config.update_one(
-                {"bot_id": self.bot.user.id}, {"$set": toset, "$unset": unset}
-            )
+    async def update_config(self, toset: dict, unset: dict = None):
+        update = {}
         if toset:
-            return await self.db.config.update_one({"bot_id": self.bot.user.id}, {"$set": toset})
+            update["$set"] = toset
         if unset:
-            return await self.db.config.update_one({"bot_id": self.bot.user.id}, {"$unset": unset})
+            update["$unset"] = unset
+        if update:
+            # lets other processes know the config changed, see `ConfigSync`
+            update["$inc"] = {"_version": 1}
+            return await self.db.config.update_one({"bot_id": self.bot.user.id}, update)
 
     async def edit_message(self, message_id: Union[int, str], new_content: str) -> None:
-        await self.logs.update_one(
-            {"messages.message_id": str(message_id)},
-            {"$set": {"messages.$.content": new_content, "messages.$.edited": True}},
-        )
+        # the message may still be waiting to be written
+        await self.log_writer.flush()
+        edits = [
+            (
+                self.logs,
+                {"messages.message_id": str(message_id)},
+                {"$set": {"messages.$.content": new_content, "messages.$.edited": True}},
+            ),
+            (
+                self.log_messages,
+                {"message_id": str(message_id)},
+                {"$set": {"content": new_content, "edited": True}},
+            ),
+        ]
+        if self.log_schema == 2:
+            edits.reverse()
+        for collection, query, update in edits:
+            result = await collection.update_one(query, update)
+            if result.matched_count:
+                break
 
     async def append_log(
         self,
@@ -208,7 +789,8 @@ class ApiClient(RequestClient):
         message_id: str = "",
         channel_id: str = "",
         type_: str = "thread_message",
-    ) -> dict:
+    ) -> None:
+        """Adds a message to the log of `channel_id`, it's written shortly by the `LogWriter`."""
         channel_id = str(channel_id) or str(message.channel.id)
         message_id = str(message_id) or str(message.id)
 
@@ -236,14 +818,228 @@ class ApiClient(RequestClient):
             ],
         }
 
-        return await self.logs.find_one_and_update(
-            {"channel_id": channel_id}, {"$push": {"messages": data}}, return_document=True
-        )
+        self.log_writer.append(channel_id, data)
 
     async def post_log(self, channel_id: Union[int, str], data: dict) -> dict:
-        return await self.logs.find_one_and_update(
+        """Updates the log of a channel, a schema 2 log is returned with its first messages."""
+        if data.get("open") is False:
+            self.log_writer.forget(channel_id)
+            log = await self.logs.find_one_and_update(
+                {"channel_id": str(channel_id), "open": True}, {"$set": data}, return_document=True
+            )
+            # counted once, even if the log is closed again
+            if log is not None:
+                await self._update_recipient_stats(
+                    log["recipient"]["id"],
+                    {
+                        "$inc": {"closed_count": 1},
+                        "$set": {
+                            "last_closed_at": log["closed_at"],
+                            "last_key": log["key"],
+                            "open_key": None,
+                            "open_channel_id": None,
+                        },
+                    },
+                )
+                return await self._with_message(log, self.preview_size)
+
+        log = await self.logs.find_one_and_update(
             {"channel_id": str(channel_id)}, {"$set": data}, return_document=True
         )
+        return await self._with_message(log, self.preview_size)
+
+    async def create_logs_view(self) -> None:
+        """Creates (or updates) the `logs_view` view."""
+        # the logs with their messages embedded, for log viewers that don't know the schema 2
+        pipeline = [
+            {
+                "$lookup": {
+                    "from": "log_messages",
+                    "let": {"key": "$key"},
+                    "pipeline": [
+                        {"$match": {"$expr": {"$eq": ["$log_key", "$$key"]}}},
+                        {"$sort": {"seq": 1}},
+                        {
+                            "$lookup": {
+                                "from": "log_authors",
+                                "localField": "author",
+                                "foreignField": "_id",
+                                "as": "author",
+                            }
+                        },
+                        {
+                            "$addFields": {
+                                "author": {
+                                    "$mergeObjects": [
+                                        {"$arrayElemAt": ["$author", 0]},
+                                        {"mod": "$mod"},
+                                    ]
+                                }
+                            }
+                        },
+                        {
+                            "$project": {
+                                "_id": 0,
+                                "log_key": 0,
+                                "seq": 0,
+                                "author_id": 0,
+                                "mod": 0,
+                                "author._id": 0,
+                            }
+                        },
+                    ],
+                    "as": "_messages",
+                }
+            },
+            {"$addFields": {"messages": {"$concatArrays": ["$messages", "$_messages"]}}},
+            {"$project": {"_messages": 0}},
+        ]
+        try:
+            try:
+                await self.db.command(
+                    {"create": "logs_view", "viewOn": "logs", "pipeline": pipeline}
+                )
+            except OperationFailure as e:
+                if e.code != 48:  # NamespaceExists
+                    raise
+                await self.db.command(
+                    {"collMod": "logs_view", "viewOn": "logs", "pipeline": pipeline}
+                )
+        except OperationFailure:
+            logger.warning("No se pudo crear la vista logs_view.", exc_info=True)
+
+    async def migrate_logs(self, batch_size: int = 20, delay: float = 1) -> int:
+        """
+        Moves the messages of the closed schema 1 logs to `log_messages`.
+
+        The logs are migrated a few at a time, so it can run while
+        the bot is in use.
+
+        Parameters
+        ----------
+        batch_size : int
+            How many logs are migrated at once.
+        delay : float
+            Seconds to wait between batches.
+
+        Returns
+        -------
+        int
+            The number of migrated logs.
+        """
+        query = {"open": False, "schema": {"$ne": 2}}
+        total = await self.logs.count_documents(query)
+        if not total:
+            return 0
+
+        logger.info("Migrando %d registros al esquema 2.", total)
+        migrated = 0
+        try:
+            while True:
+                logs = await self.logs.find(query).limit(batch_size).to_list(None)
+                if not logs:
+                    break
+                for log in logs:
+                    await self._migrate_log(log)
+                migrated += len(logs)
+                logger.info("Registros migrados: %d/%d.", migrated, total)
+                await asyncio.sleep(delay)
+        except Exception:
+            logger.error("Fallo al migrar los registros.", exc_info=True)
+        return migrated
+
+    async def _migrate_log(self, log: dict) -> None:
+        documents = []
+        authors = {}
+        for seq, message in enumerate(log.get("messages") or [], start=1):
+            document, ref, profile = to_message_document(log["key"], {**message, "seq": seq})
+            documents.append(document)
+            authors[ref] = profile
+
+        if authors:
+            await self.intern_authors(authors)
+        if documents:
+            await self.insert_log_messages(documents)
+        counts = count_participants(log.get("messages") or [])
+        await self.logs.update_one(
+            {"_id": log["_id"], "schema": {"$ne": 2}},
+            {
+                "$set": {
+                    "schema": 2,
+                    "messages": [],
+                    "message_count": len(documents),
+                    "participant_ids": list(counts),
+                    "participants": counts,
+                    "participants_counted": True,
+                }
+            },
+        )
+
+    async def index_participants(self, batch_size: int = 100, delay: float = 1) -> int:
+        """
+        Counts the participants of the logs created before they were counted.
+
+        The logs are updated a few at a time, so it can run while
+        the bot is in use. Until it's done, `responded_query`
+        also searches the messages of the remaining logs.
+
+        Parameters
+        ----------
+        batch_size : int
+            How many logs are updated at once.
+        delay : float
+            Seconds to wait between batches.
+
+        Returns
+        -------
+        int
+            The number of updated logs.
+        """
+        query = {"participants_counted": {"$exists": False}}
+        projection = {"key": True, "schema": True, "messages.author": True, "messages.type": True}
+        updated = 0
+        try:
+            while True:
+                logs = await self.logs.find(query, projection).limit(batch_size).to_list(None)
+                if not logs:
+                    break
+                ops = []
+                for log in logs:
+                    if log.get("schema") == 2:
+                        counts = await self._count_stored_participants(log["key"])
+                    else:
+                        counts = count_participants(log.get("messages") or [])
+                    ops.append(
+                        UpdateOne(
+                            {"_id": log["_id"], **query},
+                            {
+                                "$set": {
+                                    "participant_ids": list(counts),
+                                    "participants": counts,
+                                    "participants_counted": True,
+                                }
+                            },
+                        )
+                    )
+                await self.logs.bulk_write(ops, ordered=False)
+                updated += len(logs)
+                logger.debug("Participantes contados en %d registros.", updated)
+                await asyncio.sleep(delay)
+        except Exception:
+            logger.error("Fallo al contar los participantes de los registros.", exc_info=True)
+            return updated
+
+        self.participants_indexed = True
+        if updated:
+            logger.info("Participantes contados en %d registros.", updated)
+        return updated
+
+    async def _count_stored_participants(self, key: str) -> dict:
+        pipeline = [
+            {"$match": {"log_key": key, "mod": True, "type": {"$in": RESPONSE_TYPES}}},
+            {"$group": {"_id": "$author_id", "count": {"$sum": 1}}},
+        ]
+        return {doc["_id"]: doc["count"] async for doc in self.log_messages.aggregate(pipeline)}
 
 
 class PluginDatabaseClient:
@@ -7,6 +7,7 @@ from copy import deepcopy
 
 from dotenv import load_dotenv
 import isodate
+from pymongo.errors import OperationFailure
 
 import discord
 from discord.ext.commands import BadArgument
@@ -28,6 +29,7 @@ class ConfigManager:
         # Ajustes del BOT
         "main_category_id": None,
         "fallback_category_id": None,
+        "thread_channel_pool_size": 0,
         "prefix": "/",
         "mention": "@here",
         "main_color": str(discord.Color.blurple()),
@@ -53,6 +55,8 @@ class ConfigManager:
         "thread_creation_footer": "Tu mensaje fue enviado",
         "thread_self_closable_creation_footer": "Clickea en el candado para cerrar el hilo",
         "thread_creation_title": "Hilo creado",
+        "thread_creation_rate": 30,
+        "thread_queue_response": "Estamos recibiendo muchos mensajes en este momento. Estás en la fila, posición {position}, tu hilo se creará en breve.",
         "thread_close_footer": "Responder creará otro hilo",
         "thread_close_title": "Hilo cerrado",
         "thread_close_response": "{closer.mention} ha cerrado este hilo.",
@@ -85,19 +89,14 @@ class ConfigManager:
         "dm_disabled": 0,
         "oauth_whitelist": [],
         # Moderación
-        "blocked": {},
         "blocked_whitelist": [],
         "command_permissions": {},
         "level_permissions": {},
         "override_command_level": {},
-        # Hilos
-        "snippets": {},
-        "notification_squad": {},
-        "subscriptions": {},
-        "closures": {},
         # Misceláneo
         "plugins": [],
-        "aliases": {},
+        # Categorías de respaldo creadas por el bot
+        "overflow_category_ids": [],
     }
 
     protected_keys = {
@@ -113,6 +112,12 @@ class ConfigManager:
         # Registros
         "log_level": "INFO",
         "enable_plugins": True,
+        # Base de datos
+        "config_flush_delay": 1,
+        "config_sync_interval": 30,
+        "log_batch_size": 50,
+        "log_flush_interval": 1,
+        "log_schema": 1,
     }
 
     colors = {"mod_color", "recipient_color", "main_color", "error_color"}
@@ -132,12 +137,32 @@ class ConfigManager:
 
     special_types = {"status", "activity_type"}
 
+    converted_keys = colors | time_deltas | booleans | special_types
+
     defaults = {**public_keys, **private_keys, **protected_keys}
     all_keys = set(defaults.keys())
 
     def __init__(self, bot):
         self.bot = bot
         self._cache = {}
+        # the values as they are stored in the database
+        self._persisted = {}
+        # keys that were set or removed since the last update
+        self._dirty = set()
+        # mutable values handed out since the last update, they may be changed in-place
+        self._touched = set()
+        # values of `converted_keys` as returned by `get`
+        self._converted = {}
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+        self._pending_updates = 0
+        self.writes = 0
+        self.coalesced_updates = 0
+        # the version of the config document, increased by every write
+        self.version = None
+        # increased every time a value changes in the cache
+        self.generation = 0
+        self.sync = ConfigSync(self)
         self.ready_event = asyncio.Event()
         self.config_help = {}
 
@@ -167,6 +192,8 @@ class ConfigManager:
                 except json.JSONDecodeError:
                     logger.critical("Falló al cargar valores de variables de .ENV", exc_info=True)
         self._cache = data
+        self._converted.clear()
+        self.generation += 1
 
         config_help_json = os.path.join(
             os.path.dirname(os.path.abspath(__file__)), "config_help.json"
@@ -176,21 +203,188 @@ class ConfigManager:
 
         return self._cache
 
+    @property
+    def flush_delay(self) -> float:
+        try:
+            return max(float(self["config_flush_delay"]), 0)
+        except (TypeError, ValueError):
+            logger.warning("Inválido config_flush_delay, usando el valor por defecto.")
+            return float(self.remove("config_flush_delay"))
+
     async def update(self):
-        """Updates the config with data from the cache"""
-        await self.bot.api.update_config(self.filter_default(self._cache))
+        """
+        Schedules an update of the config.
+
+        Every update requested within `config_flush_delay` seconds
+        is merged into a single database write.
+        Use `flush` when the changes have to be written right away.
+        """
+        self._pending_updates += 1
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = self.bot.loop.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.flush_delay)
+        try:
+            await self.flush()
+            # keys updated while writing are picked up by the next round
+            while self._dirty or self._touched:
+                await self.flush()
+        except Exception:
+            logger.error("Fallo al guardar la configuración.", exc_info=True)
+
+    async def flush(self):
+        """Writes the keys that changed since the last write to the database"""
+        async with self._flush_lock:
+            pending, self._pending_updates = self._pending_updates, 0
+
+            keys = self._dirty | self._touched
+            self._dirty.clear()
+            self._touched.clear()
+
+            keys = {
+                k
+                for k in keys
+                if self._cache.get(k, self.defaults[k]) != self._persisted.get(k, self.defaults[k])
+            }
+            if not keys:
+                return
+
+            toset, unset = self.changes(keys)
+            # snapshot before awaiting, the cache may change while the write is in flight
+            persisted = {k: deepcopy(self._cache[k]) for k in keys if k in self._cache}
+
+            if toset or unset:
+                try:
+                    await self.bot.api.update_config(toset, unset)
+                except Exception:
+                    self._dirty |= keys
+                    self._pending_updates += pending
+                    raise
+                self.writes += 1
+                if pending > 1:
+                    self.coalesced_updates += pending - 1
+                logger.debug("Configuración guardada, %d actualizacion(es) combinadas.", pending)
+
+            for key in keys:
+                if key not in persisted or persisted[key] == self.defaults[key]:
+                    self._persisted.pop(key, None)
+                else:
+                    self._persisted[key] = persisted[key]
+
+    def changes(
+        self, keys: typing.Iterable[str]
+    ) -> typing.Tuple[typing.Dict[str, typing.Any], typing.Dict[str, str]]:
+        """
+        Computes the minimal `$set` and `$unset` documents for `keys`.
+
+        Dict values are compared per sub-key and written as dotted paths,
+        so a change to a single entry doesn't rewrite the whole dict.
+        """
+        toset = {}
+        unset = {}
+        for key in keys:
+            if key not in self.public_keys and key not in self.private_keys:
+                continue
+            default = self.defaults[key]
+            new = self._cache.get(key, default)
+            old = self._persisted.get(key, default)
+            if new == old:
+                continue
+            if new == default:
+                unset[key] = ""
+            elif (
+                isinstance(new, dict)
+                and isinstance(old, dict)
+                and all(self._valid_path(k) for k in new.keys() | old.keys())
+            ):
+                for k, v in new.items():
+                    if k not in old or old[k] != v:
+                        toset[f"{key}.{k}"] = v
+                for k in old.keys() - new.keys():
+                    unset[f"{key}.{k}"] = ""
+            else:
+                toset[key] = new
+        return toset, unset
+
+    @staticmethod
+    def _valid_path(key: typing.Any) -> bool:
+        return isinstance(key, str) and key and "." not in key and not key.startswith("$")
 
     async def refresh(self) -> dict:
         """Refreshes internal cache with data from database"""
-        for k, v in (await self.bot.api.get_config()).items():
+        # don't lose the changes that were not written yet
+        await self.flush()
+        self._persisted = {}
+        self._converted.clear()
+        self.generation += 1
+        conf = await self.bot.api.get_config()
+        self.version = conf.get("_version", 0)
+        for k, v in conf.items():
             k = k.lower()
             if k in self.all_keys:
                 self._cache[k] = v
+                self._persisted[k] = deepcopy(v)
         if not self.ready_event.is_set():
             self.ready_event.set()
             logger.debug("Se obtuvo la información de la base de datos correctamente.")
         return self._cache
 
+    def apply_remote(
+        self, doc: typing.Dict[str, typing.Any], keys: typing.Iterable[str] = None
+    ) -> typing.Set[str]:
+        """
+        Applies the changes made to the config document by another process.
+
+        Parameters
+        ----------
+        doc : dict
+            The config document as it is stored in the database.
+        keys : Iterable[str], optional
+            The keys that changed, when known. Every key is compared otherwise.
+
+        Returns
+        -------
+        Set[str]
+            The keys that were updated in the cache.
+        """
+        remote = {k.lower(): v for k, v in doc.items() if k.lower() in self.all_keys}
+        if keys is None:
+            keys = remote.keys() | self._persisted.keys()
+        else:
+            keys = {k.split(".", 1)[0].lower() for k in keys} & self.all_keys
+
+        if "_version" in doc:
+            self.version = doc["_version"]
+
+        changed = set()
+        for key in keys:
+            old = self._persisted.get(key, Default)
+            new = remote.get(key, Default)
+            if new == old:
+                continue
+            # local changes that were not written yet win, they'll overwrite the remote ones
+            if key in self._dirty or (
+                key in self._touched
+                and self._cache.get(key, self.defaults[key])
+                != self._persisted.get(key, self.defaults[key])
+            ):
+                continue
+
+            if new is Default:
+                self._persisted.pop(key, None)
+                self._cache[key] = deepcopy(self.defaults[key])
+            else:
+                self._persisted[key] = deepcopy(new)
+                self._cache[key] = deepcopy(new)
+            self._converted.pop(key, None)
+            changed.add(key)
+
+        if changed:
+            self.generation += 1
+            logger.debug("Configuración sincronizada: %s.", ", ".join(sorted(changed)))
+        return changed
+
     async def wait_until_ready(self) -> None:
         await self.ready_event.wait()
 
@@ -200,6 +394,9 @@ class ConfigManager:
         if key not in self.all_keys:
             raise InvalidConfigError(f'Clave de configuración "{key}" es inválida.')
         self._cache[key] = item
+        self._dirty.add(key)
+        self._converted.pop(key, None)
+        self.generation += 1
 
     def __getitem__(self, key: str) -> typing.Any:
         key = key.lower()
@@ -207,17 +404,31 @@ class ConfigManager:
             raise InvalidConfigError(f'Clave de configuración "{key}" es inválida.')
         if key not in self._cache:
             self._cache[key] = deepcopy(self.defaults[key])
-        return self._cache[key]
+        value = self._cache[key]
+        if isinstance(value, (dict, list)):
+            self._touched.add(key)
+        return value
 
     def __delitem__(self, key: str) -> None:
         return self.remove(key)
 
     def get(self, key: str, convert=True) -> typing.Any:
+        if convert:
+            try:
+                return self._converted[key]
+            except KeyError:
+                pass
+
         value = self.__getitem__(key)
 
         if not convert:
             return value
 
+        if key in self.converted_keys:
+            value = self._converted[key] = self._convert(key, value)
+        return value
+
+    def _convert(self, key: str, value: typing.Any) -> typing.Any:
         if key in self.colors:
             try:
                 return int(value.lstrip("#"), base=16)
@@ -333,6 +544,9 @@ class ConfigManager:
         if key in self._cache:
             del self._cache[key]
         self._cache[key] = deepcopy(self.defaults[key])
+        self._dirty.add(key)
+        self._converted.pop(key, None)
+        self.generation += 1
         return self._cache[key]
 
     def items(self) -> typing.Iterable:
@@ -358,3 +572,100 @@ class ConfigManager:
             if v != default:
                 filtered[k.lower()] = v
         return filtered
+
+
+class ConfigSync:
+    """
+    Keeps the config and the state stores in sync when several processes share the database.
+
+    A change stream is used when the database supports it (replica sets),
+    otherwise the version of the config document is polled every
+    `config_sync_interval` seconds and the document is only fetched
+    when the version changed. The state stores are reloaded when their
+    version in the config document (`_state_versions`) changed.
+
+    Parameters
+    ----------
+    config : ConfigManager
+        The config to keep in sync.
+    """
+
+    def __init__(self, config: ConfigManager):
+        self.config = config
+        self.bot = config.bot
+        self.using_change_stream = False
+        self._resume_token = None
+        self._task = None
+
+    @property
+    def interval(self) -> float:
+        try:
+            return max(float(self.config["config_sync_interval"]), 1)
+        except (TypeError, ValueError):
+            logger.warning("Inválido config_sync_interval, usando el valor por defecto.")
+            return float(self.config.remove("config_sync_interval"))
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = self.bot.loop.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while not self.bot.is_closed():
+            try:
+                await self.watch()
+            except (OperationFailure, NotImplementedError, AttributeError) as exc:
+                logger.debug("Change streams no disponibles (%s), consultando la versión.", exc)
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Se perdió el change stream de la configuración.", exc_info=True)
+                await asyncio.sleep(self.interval)
+                await self.poll()
+
+        self.using_change_stream = False
+        while not self.bot.is_closed():
+            await asyncio.sleep(self.interval)
+            try:
+                await self.poll()
+            except Exception:
+                logger.error("Fallo al sincronizar la configuración.", exc_info=True)
+
+    async def watch(self) -> None:
+        """Applies the changes as they're reported by a change stream."""
+        pipeline = [{"$match": {"fullDocument.bot_id": self.bot.user.id}}]
+        async with self.bot.db.config.watch(
+            pipeline, full_document="updateLookup", resume_after=self._resume_token
+        ) as stream:
+            self.using_change_stream = True
+            logger.debug("Sincronizando la configuración con un change stream.")
+            async for change in stream:
+                self._resume_token = stream.resume_token
+                doc = change.get("fullDocument")
+                if doc is None:
+                    continue
+                keys = None
+                if change["operationType"] == "update":
+                    description = change["updateDescription"]
+                    keys = [*description["updatedFields"], *description["removedFields"]]
+                self.config.apply_remote(doc, keys)
+                await self.bot.stores.sync(doc.get("_state_versions") or {})
+
+    async def poll(self) -> typing.Set[str]:
+        """Fetches the config document if its version changed, returns the updated keys."""
+        query = {"bot_id": self.bot.user.id}
+        doc = await self.bot.db.config.find_one(query, {"_version": True, "_state_versions": True})
+        if doc is None:
+            return set()
+        await self.bot.stores.sync(doc.get("_state_versions") or {})
+        if doc.get("_version", 0) == self.config.version:
+            return set()
+        doc = await self.bot.db.config.find_one(query)
+        if doc is None:
+            return set()
+        return self.config.apply_remote(doc)
@@ -0,0 +1,174 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from core.models import getLogger
+
+logger = getLogger(__name__)
+
+
+class IndexManager:
+    """
+    Creates the indexes of the database.
+
+    The indexes are declared in `indexes`, they're only created when
+    `version` is newer than the one recorded in the `schema_versions`
+    collection, once per process. Bump `version` after changing them.
+
+    Parameters
+    ----------
+    bot : Bot
+        The Modmail bot.
+    """
+
+    version = 3
+
+    # collection -> [(index, the queries that use it)]
+    indexes = {
+        "logs": [
+            (
+                IndexModel(
+                    [
+                        ("messages.content", "text"),
+                        ("messages.author.name", "text"),
+                        ("key", "text"),
+                    ],
+                    name="messages.content_text_messages.author.name_text_key_text",
+                ),
+                "logs search",
+            ),
+            (IndexModel([("channel_id", ASCENDING)]), "get_log, post_log, append_log"),
+            (IndexModel([("key", ASCENDING)]), "delete_log_entry, log_messages"),
+            (
+                IndexModel(
+                    [
+                        ("recipient.id", ASCENDING),
+                        ("guild_id", ASCENDING),
+                        ("open", ASCENDING),
+                        ("closed_at", DESCENDING),
+                    ]
+                ),
+                "logs, get_recipient_stats, get_latest_user_logs",
+            ),
+            (
+                IndexModel(
+                    [("closer.id", ASCENDING), ("guild_id", ASCENDING), ("open", ASCENDING)]
+                ),
+                "logs closed-by",
+            ),
+            (IndexModel([("messages.message_id", ASCENDING)]), "edit_message"),
+            (IndexModel([("open", ASCENDING)]), "get_open_logs"),
+            (
+                IndexModel(
+                    [("participant_ids", ASCENDING), ("guild_id", ASCENDING), ("open", ASCENDING)]
+                ),
+                "logs responded, logs stats",
+            ),
+        ],
+        "log_messages": [
+            (
+                IndexModel([("log_key", ASCENDING), ("seq", ASCENDING)], unique=True),
+                "with_messages",
+            ),
+            (IndexModel([("message_id", ASCENDING)]), "edit_message"),
+            (IndexModel([("content", "text")]), "logs search"),
+        ],
+        "recipient_stats": [
+            (
+                IndexModel([("guild_id", ASCENDING), ("recipient_id", ASCENDING)], unique=True),
+                "get_recipient_stats",
+            ),
+        ],
+        "linked_messages": [
+            (IndexModel([("thread_message_id", ASCENDING)], unique=True), "linked messages"),
+            (IndexModel([("dm_message_id", ASCENDING)]), "linked messages"),
+            (
+                IndexModel(
+                    [
+                        ("channel_id", ASCENDING),
+                        ("from_mod", ASCENDING),
+                        ("thread_message_id", DESCENDING),
+                    ]
+                ),
+                "latest linked message",
+            ),
+        ],
+    }
+
+    # collection -> indexes replaced by the ones above
+    obsolete = {
+        "logs": ["messages.content_text_messages.author.name_text"],
+        "log_messages": ["author_id_1_mod_1"],
+    }
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._checked = False
+
+    @property
+    def collection(self):
+        return self.bot.db.schema_versions
+
+    def declared(self) -> dict:
+        """Every declared index, including the ones of the state stores."""
+        store_index = IndexModel([("bot_id", ASCENDING), ("key", ASCENDING)], unique=True)
+        declared = {name: list(indexes) for name, indexes in self.indexes.items()}
+        for name in self.bot.stores.names:
+            declared[name] = [(store_index, name)]
+        return declared
+
+    async def setup(self) -> bool:
+        """
+        Creates the indexes if they're outdated, returns whether they were.
+
+        Only the first call does something, later calls (i.e. reconnects) return right away.
+        """
+        if self._checked:
+            return False
+        self._checked = True
+
+        doc = await self.collection.find_one({"_id": "indexes"})
+        current = doc["version"] if doc else 0
+        created = current < self.version
+        if created:
+            logger.info("Creando los índices de la base de datos (versión %d).", self.version)
+            if await self._create():
+                await self.collection.update_one(
+                    {"_id": "indexes"}, {"$set": {"version": self.version}}, upsert=True
+                )
+        await self.verify()
+        return created
+
+    async def _create(self) -> bool:
+        db = self.bot.db
+        success = True
+        for name, indexes in self.declared().items():
+            for index in self.obsolete.get(name, []):
+                try:
+                    await db[name].drop_index(index)
+                    logger.info("Eliminado el índice obsoleto %s.", index)
+                except OperationFailure:
+                    pass
+            try:
+                await db[name].create_indexes([index for index, _ in indexes])
+            except OperationFailure:
+                logger.error("Fallo al crear los índices de %s.", name, exc_info=True)
+                # try again on the next start
+                success = False
+        return success
+
+    async def verify(self) -> int:
+        """Logs a warning for every declared index that doesn't exist, returns how many."""
+        missing = 0
+        for name, indexes in self.declared().items():
+            info = await self.bot.db[name].index_information()
+            for index, queries in indexes:
+                index_name = index.document["name"]
+                if index_name not in info:
+                    missing += 1
+                    logger.warning(
+                        "Falta el índice %s en %s, estas consultas serán lentas: %s.",
+                        index_name,
+                        name,
+                        queries,
+                    )
+        return missing
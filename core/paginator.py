@@ -6,10 +6,137 @@ from discord import HTTPException, InvalidArgument
 from discord.ext import commands
 
 
+class CursorPageSource:
+    """
+    Renders pages on demand from the documents of an async database cursor.
+
+    Documents are read from the cursor as the pages are shown, with a few
+    more than needed so the next pages are ready, one document per page.
+
+    Parameters
+    ----------
+    cursor : AsyncIOMotorCursor
+        The cursor of the documents.
+    count : int
+        The number of documents, usually from `count_documents`.
+    format_page : Callable[[Dict[str, Any], int, int], Any]
+        Makes a page from a document, its index and the number of pages.
+    prepare : Callable[[List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]], optional
+        Called with every batch of documents read from the cursor.
+    read_ahead : int
+        How many documents are read past the requested page.
+
+    Attributes
+    ----------
+    entries : List[Dict[str, Any]]
+        The documents read so far.
+    count : int
+        The number of pages.
+    """
+
+    def __init__(
+        self,
+        cursor,
+        count: int,
+        format_page: typing.Callable,
+        *,
+        prepare: typing.Callable = None,
+        read_ahead: int = 5,
+    ):
+        self.cursor = cursor
+        self.count = count
+        self.format_page = format_page
+        self.prepare = prepare
+        self.read_ahead = read_ahead
+        self.entries = []
+        self._exhausted = False
+
+    def __len__(self):
+        return self.count
+
+    async def _read_until(self, index: int) -> None:
+        if index < len(self.entries) or self._exhausted:
+            return
+
+        wanted = index + 1 + self.read_ahead - len(self.entries)
+        batch = await self.cursor.to_list(wanted)
+        if len(batch) < wanted:
+            self._exhausted = True
+        if batch and self.prepare is not None:
+            batch = await self.prepare(batch)
+        self.entries.extend(batch)
+
+        # documents may be added or removed after counting them
+        if self._exhausted:
+            self.count = len(self.entries)
+        else:
+            self.count = max(self.count, len(self.entries))
+
+    async def get_page(self, index: int):
+        """
+        Get a page by page number.
+
+        Parameters
+        ----------
+        index : int
+            The index of the page.
+
+        Returns
+        -------
+        Any
+            The page, or `None` if there's no such page.
+        """
+        if not 0 <= index < self.count:
+            return None
+        await self._read_until(index)
+        if index >= len(self.entries):
+            return None
+        return self.format_page(self.entries[index], index, self.count)
+
+
+class ReactionDispatcher:
+    """
+    Routes the reactions added to the paginators' messages to their session.
+
+    A single `on_reaction_add` listener is shared by every session,
+    instead of each session waiting for reactions with `bot.wait_for`.
+
+    Parameters
+    ----------
+    bot : Bot
+        The Modmail bot.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        # message id -> queue of (reaction, user)
+        self._queues = {}
+        bot.add_listener(self.on_reaction_add)
+
+    def __len__(self):
+        return len(self._queues)
+
+    def register(self, message_id: int) -> asyncio.Queue:
+        """Returns the queue that receives the reactions added to a message."""
+        return self._queues.setdefault(message_id, asyncio.Queue())
+
+    def unregister(self, message_id: int) -> None:
+        self._queues.pop(message_id, None)
+
+    async def on_reaction_add(self, reaction: Reaction, user: User) -> None:
+        queue = self._queues.get(reaction.message.id)
+        if queue is not None:
+            queue.put_nowait((reaction, user))
+
+
 class PaginatorSession:
     """
     Class that interactively paginates something.
 
+    Reactions added within `coalesce_delay` seconds of each other are
+    handled together: the session moves straight to the page they lead
+    to with a single edit.
+
     Parameters
     ----------
     ctx : Context
@@ -18,6 +145,8 @@ class PaginatorSession:
         How long to wait for before the session closes.
     pages : List[Any]
         A list of entries to paginate.
+    coalesce_delay : float
+        How long to wait for more reactions after one is added.
 
     Attributes
     ----------
@@ -40,6 +169,8 @@ class PaginatorSession:
     def __init__(self, ctx: commands.Context, *pages, **options):
         self.ctx = ctx
         self.timeout: int = options.get("timeout", 210)
+        self.coalesce_delay: float = options.get("coalesce_delay", 0.3)
+        self._inputs: asyncio.Queue = None
         self.running = False
         self.base: Message = None
         self.current = 0
@@ -65,19 +196,38 @@ class PaginatorSession:
         """
         await self._create_base(item)
 
-        if len(self.pages) == 1:
+        if self.page_count == 1:
             self.running = False
             return
 
+        # they may be clicked while the rest are added
+        self._inputs = self.ctx.bot.reactions.register(self.base.id)
+
         self.running = True
         for reaction in self.reaction_map:
-            if len(self.pages) == 2 and reaction in "⏮⏭":
+            if self.page_count == 2 and reaction in "⏮⏭":
                 continue
             await self.ctx.bot.add_reaction(self.base, reaction)
 
     async def _create_base(self, item) -> None:
         raise NotImplementedError
 
+    @property
+    def page_count(self) -> int:
+        """The number of pages."""
+        return len(self.pages)
+
+    async def get_page(self, index: int):
+        """
+        Get a page by page number.
+
+        Parameters
+        ----------
+        index : int
+            The index of the page.
+        """
+        return self.pages[index]
+
     async def show_page(self, index: int) -> None:
         """
         Show a page by page number.
@@ -87,11 +237,13 @@ class PaginatorSession:
         index : int
             The index of the page.
         """
-        if not 0 <= index < len(self.pages):
+        if not 0 <= index < self.page_count:
             return
 
+        page = await self.get_page(index)
+        if page is None:
+            return
         self.current = index
-        page = self.pages[index]
 
         if self.running:
             await self._show_page(page)
@@ -132,20 +284,98 @@ class PaginatorSession:
         """
         if not self.running:
             await self.show_page(self.current)
-        while self.running:
-            try:
-                reaction, user = await self.ctx.bot.wait_for(
-                    "reaction_add", check=self.react_check, timeout=self.timeout
-                )
-            except asyncio.TimeoutError:
-                return await self.close(delete=False)
-            else:
-                action = self.reaction_map.get(reaction.emoji)
-                await action()
-            try:
-                await self.base.remove_reaction(reaction, user)
-            except (HTTPException, InvalidArgument):
-                pass
+        try:
+            while self.running:
+                try:
+                    reaction, user = await asyncio.wait_for(self._next_input(), self.timeout)
+                except asyncio.TimeoutError:
+                    return await self.close(delete=False)
+
+                inputs = [(reaction, user)]
+                await asyncio.sleep(self.coalesce_delay)
+                while not self._inputs.empty():
+                    reaction, user = self._inputs.get_nowait()
+                    if self.react_check(reaction, user):
+                        inputs.append((reaction, user))
+                await self.handle_inputs(inputs)
+        finally:
+            if self.base is not None:
+                self.ctx.bot.reactions.unregister(self.base.id)
+
+    async def _next_input(self) -> typing.Tuple[Reaction, User]:
+        while True:
+            reaction, user = await self._inputs.get()
+            if self.react_check(reaction, user):
+                return reaction, user
+
+    def target_page(self, action, index: int) -> typing.Optional[int]:
+        """
+        The page an action leads to.
+
+        Parameters
+        ----------
+        action : method
+            A method of `reaction_map`.
+        index : int
+            The page the action starts from.
+
+        Returns
+        -------
+        Optional[int]
+            The index of the page, `None` if the action doesn't change pages.
+        """
+        last = self.page_count - 1
+        if action == self.first_page:
+            return 0
+        if action == self.previous_page:
+            return max(index - 1, 0)
+        if action == self.next_page:
+            return min(index + 1, last)
+        if action == self.last_page:
+            return last
+        return None
+
+    async def handle_inputs(self, inputs: typing.List[typing.Tuple[Reaction, User]]) -> None:
+        """
+        Handles reactions added in quick succession.
+
+        Page changes are merged into one, then the reactions are removed.
+
+        Parameters
+        ----------
+        inputs : List[Tuple[Reaction, User]]
+            The reactions and who added them, in order.
+        """
+        target = self.current
+        for reaction, _ in inputs:
+            action = self.reaction_map.get(reaction.emoji)
+            page = self.target_page(action, target)
+            if page is not None:
+                target = page
+                continue
+
+            # other actions see the pages they were preceded by
+            if target != self.current:
+                await self.show_page(target)
+            await action()
+            if not self.running:
+                return
+            target = self.current
+
+        if target != self.current:
+            await self.show_page(target)
+
+        # the reactions are removed after the edit, all at once
+        removals = {(reaction.emoji, user.id): (reaction, user) for reaction, user in inputs}
+        results = await asyncio.gather(
+            *(self.base.remove_reaction(reaction, user) for reaction, user in removals.values()),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception) and not isinstance(
+                result, (HTTPException, InvalidArgument)
+            ):
+                raise result
 
     async def previous_page(self) -> None:
         """
@@ -197,7 +427,7 @@ class PaginatorSession:
         """
         Go to the last page.
         """
-        await self.show_page(len(self.pages) - 1)
+        await self.show_page(self.page_count - 1)
 
 
 class EmbedPaginatorSession(PaginatorSession):
@@ -224,6 +454,39 @@ class EmbedPaginatorSession(PaginatorSession):
         await self.base.edit(embed=page)
 
 
+class SourcePaginatorSession(EmbedPaginatorSession):
+    """
+    Paginates the embeds of a `CursorPageSource`, they're only made when shown.
+
+    Parameters
+    ----------
+    ctx : Context
+        The context of the command.
+    source : CursorPageSource
+        Where the pages come from.
+    """
+
+    def __init__(self, ctx: commands.Context, source: CursorPageSource, **options):
+        super().__init__(ctx, **options)
+        self.source = source
+
+    @property
+    def page_count(self) -> int:
+        return len(self.source)
+
+    def add_page(self, item: Embed) -> None:
+        raise TypeError("Las páginas se obtienen de la fuente.")
+
+    async def get_page(self, index: int) -> typing.Optional[Embed]:
+        embed = await self.source.get_page(index)
+        if embed is not None and self.page_count > 1:
+            footer_text = f"Página {index + 1} de {self.page_count}"
+            if embed.footer.text:
+                footer_text = footer_text + " • " + embed.footer.text
+            embed.set_footer(text=footer_text, icon_url=embed.footer.icon_url)
+        return embed
+
+
 class MessagePaginatorSession(PaginatorSession):
     def __init__(self, ctx: commands.Context, *messages, embed: Embed = None, **options):
         self.embed = embed
@@ -0,0 +1,548 @@
+import asyncio
+import heapq
+import re
+import typing
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from datetime import datetime
+
+from pymongo import DeleteOne, ReturnDocument, UpdateOne
+
+from core.models import getLogger
+
+logger = getLogger(__name__)
+
+
+class LinkedMessageStore:
+    """
+    Keeps track of which messages were relayed to which.
+
+    Every relayed message has a message in the thread channel and, unless
+    it's a note, a message in the recipient's DM. The log entry stores one
+    of both IDs (`log_message_id`). Links are cached in memory with a LRU
+    policy and persisted in the `linked_messages` collection so they survive
+    restarts.
+
+    Parameters
+    ----------
+    bot : Bot
+        The Modmail bot.
+    max_size : int
+        The maximum number of links kept in memory.
+    """
+
+    def __init__(self, bot, max_size: int = 5000):
+        self.bot = bot
+        self.max_size = max_size
+        self._by_thread = OrderedDict()
+        self._by_dm = {}
+        # channel id -> {from_mod: link}
+        self._latest = {}
+        # channel id -> inserts still being written
+        self._pending = {}
+
+    @property
+    def collection(self):
+        return self.bot.db.linked_messages
+
+    def _cache(self, link: dict) -> dict:
+        self._by_thread[link["thread_message_id"]] = link
+        self._by_thread.move_to_end(link["thread_message_id"])
+        if link.get("dm_message_id") is not None:
+            self._by_dm[link["dm_message_id"]] = link
+
+        while len(self._by_thread) > self.max_size:
+            _, old = self._by_thread.popitem(last=False)
+            self._by_dm.pop(old.get("dm_message_id"), None)
+        return link
+
+    def _uncache(self, link: dict) -> None:
+        self._by_thread.pop(link["thread_message_id"], None)
+        self._by_dm.pop(link.get("dm_message_id"), None)
+        latest = self._latest.get(link["channel_id"], {})
+        if latest.get(link["from_mod"]) is link:
+            del latest[link["from_mod"]]
+
+    def add(
+        self,
+        channel_id: int,
+        thread_message_id: int,
+        dm_message_id: int = None,
+        *,
+        log_message_id: int = None,
+        from_mod: bool = False,
+    ) -> dict:
+        """
+        Registers a link, the link is available immediately
+        and is written to the database in the background.
+        """
+        link = {
+            "channel_id": channel_id,
+            "thread_message_id": thread_message_id,
+            "dm_message_id": dm_message_id,
+            "log_message_id": log_message_id,
+            "from_mod": from_mod,
+        }
+        self._cache(link)
+        self._latest.setdefault(channel_id, {})[from_mod] = link
+        task = self.bot.loop.create_task(self._insert(dict(link)))
+        self._pending.setdefault(channel_id, set()).add(task)
+        task.add_done_callback(lambda t: self._insert_done(channel_id, t))
+        return link
+
+    def _insert_done(self, channel_id: int, task: asyncio.Task) -> None:
+        pending = self._pending.get(channel_id)
+        if pending is not None:
+            pending.discard(task)
+            if not pending:
+                del self._pending[channel_id]
+
+    async def _insert(self, link: dict) -> None:
+        try:
+            await self.collection.insert_one(link)
+        except Exception:
+            logger.error("Fallo al guardar el enlace del mensaje.", exc_info=True)
+
+    async def _wait_inserts(self, channel_id: int) -> None:
+        pending = self._pending.pop(channel_id, None)
+        if pending:
+            # a delete must not run before the inserts it should remove
+            await asyncio.gather(*pending)
+
+    async def _find_one(self, query: dict, **kwargs) -> typing.Optional[dict]:
+        link = await self.collection.find_one(query, {"_id": False}, **kwargs)
+        if link is not None:
+            self._cache(link)
+        return link
+
+    async def from_thread_message(self, message_id: int) -> typing.Optional[dict]:
+        """Retrieves a link from the ID of the message in the thread channel."""
+        link = self._by_thread.get(message_id)
+        if link is not None:
+            self._by_thread.move_to_end(message_id)
+            return link
+        return await self._find_one({"thread_message_id": message_id})
+
+    async def from_dm_message(self, message_id: int) -> typing.Optional[dict]:
+        """Retrieves a link from the ID of the message in the recipient's DM."""
+        link = self._by_dm.get(message_id)
+        if link is not None:
+            self._by_thread.move_to_end(link["thread_message_id"])
+            return link
+        return await self._find_one({"dm_message_id": message_id})
+
+    async def latest(
+        self, channel_id: int, either_direction: bool = False
+    ) -> typing.Optional[dict]:
+        """
+        Retrieves the most recent link of a thread channel.
+
+        Only staff replies are considered, unless `either_direction` is `True`.
+        """
+        directions = (True, False) if either_direction else (True,)
+        latest = self._latest.setdefault(channel_id, {})
+
+        links = []
+        for from_mod in directions:
+            if from_mod not in latest:
+                link = await self._find_one(
+                    {"channel_id": channel_id, "from_mod": from_mod},
+                    sort=[("thread_message_id", -1)],
+                )
+                if link is None:
+                    continue
+                latest[from_mod] = link
+            links.append(latest[from_mod])
+
+        # Snowflakes are chronological
+        return max(links, key=lambda l: l["thread_message_id"], default=None)
+
+    async def remove(self, thread_message_id: int) -> None:
+        link = self._by_thread.get(thread_message_id)
+        if link is not None:
+            self._uncache(link)
+            await self._wait_inserts(link["channel_id"])
+        await self.collection.delete_one({"thread_message_id": thread_message_id})
+
+    async def forget_channel(self, channel_id: int) -> None:
+        """Drops every link of a closed thread channel."""
+        self._latest.pop(channel_id, None)
+        for link in [l for l in self._by_thread.values() if l["channel_id"] == channel_id]:
+            self._uncache(link)
+        await self._wait_inserts(channel_id)
+        await self.collection.delete_many({"channel_id": channel_id})
+
+
+class StateStore(MutableMapping):
+    """
+    A dict-like mapping persisted with one document per key.
+
+    Reads are served from memory, every change is written
+    to the database in the background as a point write.
+    Values mutated in-place have to be re-assigned (or `touch`-ed)
+    for the change to be saved.
+
+    Every write bumps the version of the store in the config document
+    (`_state_versions`), the stores of the other processes sharing the
+    database are reloaded when it changes, see `ConfigSync`.
+
+    Parameters
+    ----------
+    bot : Bot
+        The Modmail bot.
+    name : str
+        The name of the collection.
+    synced : bool
+        Whether the changes made by other processes are loaded.
+    """
+
+    def __init__(self, bot, name: str, *, synced: bool = True):
+        self.bot = bot
+        self.name = name
+        self.synced = synced
+        # the version of the store that is loaded, `None` until it's loaded
+        self.version = None
+        self._cache = {}
+        self._dirty = set()
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+
+    def __repr__(self):
+        return f"StateStore({self.name!r}, {self._cache!r})"
+
+    @property
+    def collection(self):
+        return self.bot.db[self.name]
+
+    def __getitem__(self, key: str) -> typing.Any:
+        return self._cache[key]
+
+    def __setitem__(self, key: str, value: typing.Any) -> None:
+        self._cache[key] = value
+        self.touch(key)
+
+    def __delitem__(self, key: str) -> None:
+        del self._cache[key]
+        self.touch(key)
+
+    def __iter__(self):
+        return iter(self._cache)
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __contains__(self, key: typing.Any) -> bool:
+        return key in self._cache
+
+    def touch(self, key: str) -> None:
+        """Marks a key as changed, it will be written shortly."""
+        self._dirty.add(key)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = self.bot.loop.create_task(self._background_flush())
+
+    async def _background_flush(self) -> None:
+        try:
+            # keys touched while writing are picked up by the next round
+            while self._dirty:
+                await self.flush()
+        except Exception:
+            logger.error("Fallo al guardar %s.", self.name, exc_info=True)
+
+    async def flush(self) -> None:
+        """Writes every changed key to the database."""
+        async with self._flush_lock:
+            keys, self._dirty = self._dirty, set()
+            if not keys:
+                return
+
+            bot_id = self.bot.user.id
+            ops = []
+            for key in keys:
+                query = {"bot_id": bot_id, "key": key}
+                if key in self._cache:
+                    ops.append(
+                        UpdateOne(query, {"$set": {"value": self._cache[key]}}, upsert=True)
+                    )
+                else:
+                    ops.append(DeleteOne(query))
+
+            try:
+                await self.collection.bulk_write(ops, ordered=False)
+            except Exception:
+                self._dirty |= keys
+                raise
+            if self.synced:
+                await self._bump_version()
+
+    async def _bump_version(self) -> None:
+        field = f"_state_versions.{self.name}"
+        doc = await self.bot.db.config.find_one_and_update(
+            {"bot_id": self.bot.user.id},
+            {"$inc": {field: 1}},
+            projection={field: True},
+            return_document=ReturnDocument.AFTER,
+        )
+        version = ((doc or {}).get("_state_versions") or {}).get(self.name, 0)
+        # otherwise another process wrote in between, it's picked up by the next sync
+        if self.version is not None and version == self.version + 1:
+            self.version = version
+
+    async def _fetch(self) -> dict:
+        cursor = self.collection.find({"bot_id": self.bot.user.id}, {"key": 1, "value": 1})
+        return {doc["key"]: doc["value"] async for doc in cursor}
+
+    async def load(self, version: int = 0) -> None:
+        self._cache = await self._fetch()
+        self.version = version
+        logger.debug("Cargados %d elemento(s) de %s.", len(self._cache), self.name)
+
+    async def sync(self, version: int) -> typing.Set[str]:
+        """
+        Loads the changes made by other processes, returns the keys that changed.
+
+        Keys changed locally that were not written yet are kept.
+        """
+        async with self._flush_lock:
+            if version == self.version:
+                return set()
+            remote = await self._fetch()
+            changed = set()
+            for key in (remote.keys() | self._cache.keys()) - self._dirty:
+                if key not in remote:
+                    self._cache.pop(key)
+                elif key not in self._cache or self._cache[key] != remote[key]:
+                    self._cache[key] = remote[key]
+                else:
+                    continue
+                changed.add(key)
+                self._synced(key, remote.get(key))
+            self.version = version
+
+        if changed:
+            logger.debug("Sincronizados %d elemento(s) de %s.", len(changed), self.name)
+        return changed
+
+    def _synced(self, key: str, value: typing.Any) -> None:
+        """Called for every key changed by another process, `value` is `None` if it was removed."""
+
+    def migrate(self, legacy: typing.Dict[str, typing.Any]) -> int:
+        """Imports the entries stored in the config document, returns how many were new."""
+        count = 0
+        for key, value in legacy.items():
+            if key not in self._cache:
+                self[key] = value
+                count += 1
+        return count
+
+
+class BlockList(StateStore):
+    """
+    The blocked users, keyed by user ID.
+
+    Every entry is a record with the `reason`, the `source` of the block
+    (`manual`, `account_age` or `guild_age`) and when it `expires_at`
+    (an ISO-8601 UTC date, or `None` for permanent blocks).
+    Expiries are kept in a min-heap, a background task unblocks
+    the users when their block expires.
+    """
+
+    sources = {"manual", "account_age", "guild_age"}
+
+    def __init__(self, bot, name: str = "blocked"):
+        super().__init__(bot, name)
+        # (expires_at, user_id), may hold stale entries, they're skipped when popped
+        self._expiries = []
+        self._wakeup = asyncio.Event()
+        self._sweeper_task = None
+
+    def __setitem__(self, key: str, value: typing.Any) -> None:
+        record = self.to_record(value)
+        super().__setitem__(str(key), record)
+        self._schedule(str(key), record)
+
+    @staticmethod
+    def to_record(value: typing.Any) -> dict:
+        """Converts a legacy reason string to a block record."""
+        if isinstance(value, dict):
+            return value
+
+        reason = (value or "").strip()
+        if reason.startswith("System Message:"):
+            reason = reason[len("System Message:") :].strip()
+            source = "guild_age" if reason.startswith("Recently Joined") else "account_age"
+            # the age checks set its expiry on the next message, or unblock the user
+            return {"reason": reason, "source": source, "expires_at": None}
+
+        # etc "Por ... hasta 2019-10-14T21:12:45.559948." or the older "... %2019-10-14T21:12:45%"
+        expires_at = None
+        match = re.search(r" (?:until|hasta) ([^`\s]+?)\.$", reason) or re.search(
+            r" ?%([^%]+?)%", reason
+        )
+        if match is not None:
+            try:
+                expires_at = datetime.fromisoformat(match.group(1)).isoformat()
+            except ValueError:
+                pass
+            else:
+                reason = reason[: match.start()] + reason[match.end() :]
+        return {"reason": reason.strip().rstrip("."), "source": "manual", "expires_at": expires_at}
+
+    @staticmethod
+    def describe(record: typing.Optional[dict]) -> str:
+        """The reason of a block, as shown to the staff and the user."""
+        if not record:
+            return ""
+        if record["source"] != "manual":
+            return f"System Message: {record['reason']}"
+        reason = record["reason"]
+        if record.get("expires_at"):
+            reason += f" hasta {record['expires_at']}"
+        return reason + "." if reason else ""
+
+    def block(
+        self,
+        user_id: typing.Union[int, str],
+        reason: str,
+        *,
+        expires_at: datetime = None,
+        source: str = "manual",
+    ) -> dict:
+        if source not in self.sources:
+            raise ValueError(f"Origen de bloqueo inválido: {source}.")
+        record = {
+            "reason": reason,
+            "source": source,
+            "expires_at": expires_at.isoformat() if expires_at is not None else None,
+        }
+        self[str(user_id)] = record
+        return record
+
+    def active(self, user_id: typing.Union[int, str]) -> typing.Optional[dict]:
+        """The record of a blocked user, `None` when the user isn't blocked (anymore)."""
+        record = self._cache.get(str(user_id))
+        if record is None or not self._expired(record, datetime.utcnow()):
+            return record
+        del self[str(user_id)]
+        return None
+
+    @staticmethod
+    def _expired(record: dict, now: datetime) -> bool:
+        expires_at = record.get("expires_at")
+        return expires_at is not None and datetime.fromisoformat(expires_at) <= now
+
+    def _schedule(self, user_id: str, record: dict) -> None:
+        if record.get("expires_at") is None:
+            return
+        expires_at = datetime.fromisoformat(record["expires_at"])
+        heapq.heappush(self._expiries, (expires_at, user_id))
+        if self._expiries[0][1] == user_id:
+            # sooner than what the sweeper is waiting for
+            self._wakeup.set()
+
+    def sweep(self) -> int:
+        """Unblocks every user whose block expired, returns how many were unblocked."""
+        now = datetime.utcnow()
+        count = 0
+        while self._expiries and self._expiries[0][0] <= now:
+            _, user_id = heapq.heappop(self._expiries)
+            record = self._cache.get(user_id)
+            if record is not None and self._expired(record, now):
+                del self[user_id]
+                count += 1
+        if count:
+            logger.debug("Desbloqueados %d usuario(s), su bloqueo expiró.", count)
+        return count
+
+    def _synced(self, key: str, value: typing.Any) -> None:
+        if value is not None:
+            self._schedule(key, value)
+
+    async def _sweeper(self) -> None:
+        while True:
+            self._wakeup.clear()
+            timeout = None
+            if self._expiries:
+                timeout = (self._expiries[0][0] - datetime.utcnow()).total_seconds()
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            self.sweep()
+
+    async def load(self, version: int = 0) -> None:
+        await super().load(version)
+        self._expiries = []
+        for user_id, value in list(self._cache.items()):
+            if not isinstance(value, dict):
+                # written before blocks were stored as records
+                self[user_id] = value
+            else:
+                self._schedule(user_id, value)
+        if self._sweeper_task is None or self._sweeper_task.done():
+            self._sweeper_task = self.bot.loop.create_task(self._sweeper())
+
+
+class StateManager:
+    """
+    Holds the frequently changing state that
+    used to be stored in the config document.
+    """
+
+    names = ("blocked", "closures", "subscriptions", "notification_squad", "snippets", "aliases")
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.loaded = False
+        self.blocked = BlockList(bot)
+        # closes are scheduled by the process that runs them
+        self.closures = StateStore(bot, "closures", synced=False)
+        self.subscriptions = StateStore(bot, "subscriptions")
+        self.notification_squad = StateStore(bot, "notification_squad")
+        self.snippets = StateStore(bot, "snippets")
+        self.aliases = StateStore(bot, "aliases")
+
+    def __iter__(self):
+        return (getattr(self, name) for name in self.names)
+
+    async def load(self) -> None:
+        if self.loaded:
+            return
+        # read before the stores, a change made meanwhile is loaded by the next sync
+        versions = await self._versions()
+        await asyncio.gather(*(store.load(versions.get(store.name, 0)) for store in self))
+        await self.migrate()
+        self.loaded = True
+
+    async def _versions(self) -> typing.Dict[str, int]:
+        query = {"bot_id": self.bot.user.id}
+        conf = await self.bot.db.config.find_one(query, {"_state_versions": True})
+        return (conf or {}).get("_state_versions") or {}
+
+    async def sync(self, versions: typing.Dict[str, int] = None) -> None:
+        """Reloads the stores whose version changed, `versions` are read if not given."""
+        if not self.loaded:
+            return
+        if versions is None:
+            versions = await self._versions()
+        await asyncio.gather(
+            *(store.sync(versions.get(store.name, 0)) for store in self if store.synced)
+        )
+
+    async def migrate(self) -> None:
+        """Moves the state out of the config document, only does something once."""
+        query = {"bot_id": self.bot.user.id}
+        conf = await self.bot.db.config.find_one(query, {name: 1 for name in self.names})
+        legacy = {name: conf[name] for name in self.names if conf and name in conf}
+        if not legacy:
+            return
+
+        for name, values in legacy.items():
+            count = getattr(self, name).migrate(values or {})
+            logger.info("Migrados %d elemento(s) de %s fuera de la configuración.", count, name)
+
+        await self.flush()
+        await self.bot.db.config.update_one(query, {"$unset": {name: "" for name in legacy}})
+
+    async def flush(self) -> None:
+        await asyncio.gather(*(store.flush() for store in self))
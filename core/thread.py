@@ -1,6 +1,10 @@
 import asyncio
+import heapq
+import random
 import re
+import time
 import typing
+from collections import deque
 from datetime import datetime, timedelta
 from types import SimpleNamespace
 
@@ -19,6 +23,9 @@ logger = getLogger(__name__)
 class Thread:
     """Represents a discord Modmail thread"""
 
+    # how many messages can wait for the thread to be set up
+    max_pending_messages = 50
+
     def __init__(
         self,
         manager: "ThreadManager",
@@ -38,8 +45,15 @@ class Thread:
         self._channel = channel
         self.genesis_message = None
         self._ready_event = asyncio.Event()
-        self.close_task = None
-        self.auto_close_task = None
+        # messages received while the thread is set up, sent in order once it's done
+        self._buffering = channel is None
+        self._pending_messages = deque()
+        # relay jobs (send, reply, note) of this thread, run one after the other
+        self._relay_queue = deque()
+        self._relay_worker = None
+        self.relayed = 0
+        self.relay_latency = 0.0
+        self.max_relay_latency = 0.0
 
     def __repr__(self):
         return f'Thread(recipient="{self.recipient or self.id}", channel={self.channel.id})'
@@ -56,6 +70,16 @@ class Thread:
     def id(self) -> int:
         return self._id
 
+    @property
+    def close_task(self) -> typing.Optional[dict]:
+        """The pending scheduled close, if any."""
+        return self.manager.closures.get(self.id)
+
+    @property
+    def auto_close_task(self) -> typing.Optional[dict]:
+        """The pending automatic close, if any."""
+        return self.manager.closures.get(self.id, auto_close=True)
+
     @property
     def channel(self) -> typing.Union[discord.TextChannel, discord.DMChannel]:
         return self._channel
@@ -91,16 +115,45 @@ class Thread:
         if category is not None:
             overwrites = None
 
-        try:
-            channel = await self.bot.modmail_guild.create_text_channel(
-                name=format_channel_name(recipient, self.bot.modmail_guild),
-                category=category,
-                overwrites=overwrites,
-                reason="Creando un canal de hilo...",
-            )
-        except discord.HTTPException as e:  # Failed to create due to missing perms.
-            logger.critical("Un error ocurrió al crear el hilo.", exc_info=True)
-            self.manager.cache.pop(self.id)
+        async def get_log_count():
+            try:
+                return await self.bot.api.get_user_log_count(recipient.id)
+            except Exception:
+                logger.error("Un error ocurrió al contar los registros.", exc_info=True)
+                return None
+
+        async def create_channel():
+            start = time.perf_counter()
+            name = format_channel_name(recipient, self.bot.modmail_guild)
+            topic = f"ID del usuario: {recipient.id}"
+
+            channel = None
+            if category is not None:
+                channel = await self.manager.channel_pool.claim(category, name=name, topic=topic)
+            pooled = channel is not None
+            if not pooled:
+                channel = await self.bot.modmail_guild.create_text_channel(
+                    name=name,
+                    category=category,
+                    overwrites=overwrites,
+                    topic=topic,
+                    reason="Creando un canal de hilo...",
+                )
+            self.manager.channel_pool.record_latency(pooled, time.perf_counter() - start)
+            return channel
+
+        # the log count is fetched while the channel is created
+        channel, log_count = await asyncio.gather(
+            create_channel(), get_log_count(), return_exceptions=True
+        )
+
+        if isinstance(channel, Exception):
+            if not isinstance(channel, discord.HTTPException):
+                raise channel
+            # Failed to create due to missing perms.
+            e = channel
+            logger.critical("Un error ocurrió al crear el hilo.", exc_info=e)
+            self.manager.unregister(self)
 
             embed = discord.Embed(color=self.bot.error_color)
             embed.title = "Error mientras se intentaba crear el hilo"
@@ -113,19 +166,15 @@ class Thread:
 
         self._channel = channel
 
+        # the log entry has to exist before messages are relayed and logged
         try:
-            log_url, log_data = await asyncio.gather(
-                self.bot.api.create_log_entry(recipient, channel, creator or recipient),
-                self.bot.api.get_user_logs(recipient.id),
-            )
-
-            log_count = sum(1 for log in log_data if not log["open"])
+            log_url = await self.bot.api.create_log_entry(recipient, channel, creator or recipient)
         except Exception:
             logger.error("Un error ocurrió al subir los datos a la base de datos.", exc_info=True)
-            log_url = log_count = None
+            log_url = None
             # ensure core functionality still works
 
-        await channel.edit(topic=f"ID del usuario: {recipient.id}")
+        self.manager.register(self)
         self.ready = True
 
         if creator:
@@ -139,6 +188,7 @@ class Thread:
             )
             try:
                 msg = await channel.send(mention, embed=info_embed)
+                # pinning doesn't hold up the first relayed message
                 self.bot.loop.create_task(msg.pin())
                 self.genesis_message = msg
             except Exception:
@@ -247,11 +297,6 @@ class Thread:
 
         return embed
 
-    def _close_after(self, closer, silent, delete_channel, message):
-        return self.bot.loop.create_task(
-            self._close(closer, silent, delete_channel, message, True)
-        )
-
     async def close(
         self,
         *,
@@ -268,49 +313,37 @@ class Thread:
         await self.cancel_closure(auto_close)
 
         if after > 0:
-            # TODO: Add somewhere to clean up broken closures
-            #  (when channel is already deleted)
-            now = datetime.utcnow()
-            items = {
-                # 'initiation_time': now.isoformat(),
-                "time": (now + timedelta(seconds=after)).isoformat(),
-                "closer_id": closer.id,
-                "silent": silent,
-                "delete_channel": delete_channel,
-                "message": message,
-                "auto_close": auto_close,
-            }
-            self.bot.config["closures"][str(self.id)] = items
-            await self.bot.config.update()
-
-            task = self.bot.loop.call_later(
-                after, self._close_after, closer, silent, delete_channel, message
+            self.manager.closures.schedule(
+                self.id,
+                datetime.utcnow() + timedelta(seconds=after),
+                closer=closer,
+                silent=silent,
+                delete_channel=delete_channel,
+                message=message,
+                auto_close=auto_close,
             )
-
-            if auto_close:
-                self.auto_close_task = task
-            else:
-                self.close_task = task
         else:
             await self._close(closer, silent, delete_channel, message)
 
     async def _close(
         self, closer, silent=False, delete_channel=True, message=None, scheduled=False
     ):
-        try:
-            self.manager.cache.pop(self.id)
-        except KeyError as e:
-            logger.error("El hilo ya está cerrado: %s.", e)
+        if not self.manager.unregister(self):
+            logger.error("El hilo ya está cerrado: %s.", self.id)
             return
 
         await self.cancel_closure(all=True)
 
         # Cancel auto closing the thread if closed by any means.
 
-        self.bot.config["subscriptions"].pop(str(self.id), None)
-        self.bot.config["notification_squad"].pop(str(self.id), None)
+        self.bot.stores.subscriptions.pop(str(self.id), None)
+        self.bot.stores.notification_squad.pop(str(self.id), None)
 
         # Logging
+        try:
+            await self.bot.api.log_writer.flush()
+        except Exception:
+            logger.error("Fallo al guardar los mensajes del hilo.", exc_info=True)
         log_data = await self.bot.api.post_log(
             self.channel.id,
             {
@@ -364,7 +397,7 @@ class Thread:
         embed.set_footer(text=f"{event} by {_closer}")
         embed.timestamp = datetime.utcnow()
 
-        tasks = [self.bot.config.update()]
+        tasks = [self.bot.linked_messages.forget_channel(self.channel.id)]
 
         if self.bot.log_channel is not None:
             tasks.append(self.bot.log_channel.send(embed=embed))
@@ -400,38 +433,25 @@ class Thread:
         await asyncio.gather(*tasks)
 
     async def cancel_closure(self, auto_close: bool = False, all: bool = False) -> None:
-        if self.close_task is not None and (not auto_close or all):
-            self.close_task.cancel()
-            self.close_task = None
-        if self.auto_close_task is not None and (auto_close or all):
-            self.auto_close_task.cancel()
-            self.auto_close_task = None
-
-        to_update = self.bot.config["closures"].pop(str(self.id), None)
-        if to_update is not None:
-            await self.bot.config.update()
-
-    async def _restart_close_timer(self):
+        if not auto_close or all:
+            self.manager.closures.cancel(self.id)
+        if auto_close or all:
+            self.manager.closures.cancel(self.id, auto_close=True)
+
+    def _restart_close_timer(self) -> None:
         """
         This will create or restart a timer to automatically close this
-        thread.
+        thread. It only records the activity, see `CloseScheduler.touch`.
         """
-        timeout = self.bot.config.get("thread_auto_close")
-
-        # Exit if timeout was not set
-        if timeout == isodate.Duration():
-            return
+        self.manager.closures.touch(self)
 
-        # Set timeout seconds
-        seconds = timeout.total_seconds()
-        # seconds = 20  # Uncomment to debug with just 20 seconds
-        reset_time = datetime.utcnow() + timedelta(seconds=seconds)
+    def _auto_close_items(self, timeout: timedelta) -> dict:
+        """The options of the automatic close, as they're persisted."""
+        reset_time = datetime.utcnow() + timeout
         human_time = human_timedelta(dt=reset_time)
 
         if self.bot.config.get("thread_auto_close_silently"):
-            return await self.close(
-                closer=self.bot.user, silent=True, after=int(seconds), auto_close=True
-            )
+            return {"silent": True, "message": None}
 
         # Grab message
         close_message = self.bot.formatter.format(
@@ -447,9 +467,18 @@ class Thread:
                 time_marker_regex,
             )
 
-        await self.close(
-            closer=self.bot.user, after=int(seconds), message=close_message, auto_close=True
-        )
+        return {"silent": False, "message": close_message}
+
+    async def _get_message(
+        self, messageable: discord.abc.Messageable, message_id: int
+    ) -> typing.Optional[discord.Message]:
+        message = discord.utils.get(self.bot.cached_messages, id=message_id)
+        if message is not None:
+            return message
+        try:
+            return await messageable.fetch_message(message_id)
+        except discord.NotFound:
+            return None
 
     async def find_linked_messages(
         self,
@@ -492,25 +521,20 @@ class Thread:
             ):
                 raise ValueError("Mensaje del hilo no encontrado.")
         else:
-            async for message1 in self.channel.history():
-                if (
-                    message1.embeds
-                    and message1.embeds[0].author.url
-                    and message1.embeds[0].color
-                    and (
-                        message1.embeds[0].color.value == self.bot.mod_color
-                        or (
-                            either_direction
-                            and message1.embeds[0].color.value == self.bot.recipient_color
-                        )
-                    )
-                    and message1.embeds[0].author.url.split("#")[-1].isdigit()
-                    and message1.author == self.bot.user
-                ):
-                    break
-            else:
-                raise ValueError("Mensaje del hilo no encontrado.")
-
+            link = await self.bot.linked_messages.latest(self.channel.id, either_direction)
+            if link is not None:
+                message1 = await self._get_message(self.channel, link["thread_message_id"])
+            if message1 is None:
+                message1 = await self._find_latest_from_history(either_direction)
+
+        link = await self.bot.linked_messages.from_thread_message(message1.id)
+        if link is not None and link["dm_message_id"] is not None:
+            message2 = await self._get_message(self.recipient, link["dm_message_id"])
+            if message2 is None:
+                raise ValueError("Mensaje de MD no encontrado.")
+            return message1, message2
+
+        # Messages relayed before links were stored
         try:
             joint_id = int(message1.embeds[0].author.url.split("#")[-1])
         except ValueError:
@@ -530,6 +554,25 @@ class Thread:
                 continue
         raise ValueError("Mensaje de MD no encontrado.")
 
+    async def _find_latest_from_history(self, either_direction: bool) -> discord.Message:
+        async for message in self.channel.history():
+            if (
+                message.embeds
+                and message.embeds[0].author.url
+                and message.embeds[0].color
+                and (
+                    message.embeds[0].color.value == self.bot.mod_color
+                    or (
+                        either_direction
+                        and message.embeds[0].color.value == self.bot.recipient_color
+                    )
+                )
+                and message.embeds[0].author.url.split("#")[-1].isdigit()
+                and message.author == self.bot.user
+            ):
+                return message
+        raise ValueError("Mensaje del hilo no encontrado.")
+
     async def edit_message(self, message_id: typing.Optional[int], message: str) -> None:
         try:
             message1, message2 = await self.find_linked_messages(message_id)
@@ -555,15 +598,22 @@ class Thread:
             message1, message2 = await self.find_linked_messages(message1=message, note=note)
         else:
             message1, message2 = await self.find_linked_messages(message, note=note)
-        tasks = []
+        tasks = [self.bot.linked_messages.remove(message1.id)]
         if not isinstance(message, discord.Message):
             tasks += [message1.delete()]
         if message2 is not None:
             tasks += [message2.delete()]
-        if tasks:
-            await asyncio.gather(*tasks)
+        await asyncio.gather(*tasks)
 
     async def find_linked_message_from_dm(self, message, either_direction=False):
+        link = await self.bot.linked_messages.from_dm_message(message.id)
+        if link is not None:
+            linked_message = await self._get_message(self.channel, link["thread_message_id"])
+            if linked_message is not None:
+                return linked_message
+            raise ValueError("Canal de mensaje del hilo no encotrado.")
+
+        # Messages relayed before links were stored
         if either_direction and message.embeds:
             compare_url = message.embeds[0].author.url
         else:
@@ -599,21 +649,76 @@ class Thread:
             self.bot.api.edit_message(message.id, content), linked_message.edit(embed=embed)
         )
 
+    @property
+    def relay_queue_depth(self) -> int:
+        return len(self._relay_queue)
+
+    def relay_metrics(self) -> dict:
+        """The relay queue depth and latencies (in seconds) of this thread."""
+        return {
+            "queue_depth": self.relay_queue_depth,
+            "relayed": self.relayed,
+            "average_latency": self.relay_latency / self.relayed if self.relayed else 0.0,
+            "max_latency": self.max_relay_latency,
+        }
+
+    async def _relay(self, func, *args) -> typing.Any:
+        """
+        Runs a relay job once the previous ones of this thread are done.
+
+        Jobs of different threads run in parallel, up to
+        `ThreadManager.max_concurrent_relays` at once.
+        """
+        future = self.bot.loop.create_future()
+        self._relay_queue.append((future, func, args, time.perf_counter()))
+        if self._relay_worker is None or self._relay_worker.done():
+            self._relay_worker = self.bot.loop.create_task(self._process_relays())
+        return await future
+
+    async def _process_relays(self) -> None:
+        while self._relay_queue:
+            future, func, args, queued_at = self._relay_queue.popleft()
+            if future.done():
+                # the caller was cancelled
+                continue
+
+            async with self.manager.relay_semaphore:
+                try:
+                    result = await func(*args)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+
+            latency = time.perf_counter() - queued_at
+            self.relayed += 1
+            self.relay_latency += latency
+            self.max_relay_latency = max(self.max_relay_latency, latency)
+
     async def note(self, message: discord.Message) -> None:
+        return await self._relay(self._note, message)
+
+    async def _note(self, message: discord.Message) -> None:
         if not message.content and not message.attachments:
             raise MissingRequiredArgument(SimpleNamespace(name="msg"))
 
-        msg = await self.send(message, self.channel, note=True)
+        msg = await self._send(message, self.channel, note=True)
 
-        self.bot.loop.create_task(
-            self.bot.api.append_log(
+        try:
+            await self.bot.api.append_log(
                 message, message_id=msg.id, channel_id=self.channel.id, type_="system"
             )
-        )
+        except Exception:
+            logger.error("Fallo al registrar la nota.", exc_info=True)
 
         return msg
 
     async def reply(self, message: discord.Message, anonymous: bool = False) -> None:
+        return await self._relay(self._reply, message, anonymous)
+
+    async def _reply(self, message: discord.Message, anonymous: bool = False) -> None:
         if not message.content and not message.attachments:
             raise MissingRequiredArgument(SimpleNamespace(name="msg"))
         if not any(g.get_member(self.id) for g in self.bot.guilds):
@@ -628,7 +733,7 @@ class Thread:
         tasks = []
 
         try:
-            await self.send(
+            dm_msg = await self._send(
                 message, destination=self.recipient, from_mod=True, anonymous=anonymous
             )
         except Exception:
@@ -646,9 +751,12 @@ class Thread:
             )
         else:
             # Send the same thing in the thread channel.
-            msg = await self.send(
+            msg = await self._send(
                 message, destination=self.channel, from_mod=True, anonymous=anonymous
             )
+            self.bot.linked_messages.add(
+                self.channel.id, msg.id, dm_msg.id, log_message_id=msg.id, from_mod=True
+            )
 
             tasks.append(
                 self.bot.api.append_log(
@@ -683,28 +791,50 @@ class Thread:
         note: bool = False,
         anonymous: bool = False,
     ) -> None:
+        args = (message, destination, from_mod, note, anonymous)
+        if not self._buffering:
+            return await self._relay(self._send, *args)
+
+        # The thread is being set up, the message is sent once it's done
+        if len(self._pending_messages) >= self.max_pending_messages:
+            self.manager.dropped_messages += 1
+            logger.warning("Demasiados mensajes esperando al hilo de %s, descartado.", self.id)
+            raise CommandError("Demasiados mensajes esperando a que se cree el hilo.")
+
+        future = self.bot.loop.create_future()
+        self._pending_messages.append((future, args))
+        self.manager.max_pending_messages = max(
+            self.manager.max_pending_messages, len(self._pending_messages)
+        )
+        return await future
 
-        self.bot.loop.create_task(
-            self._restart_close_timer()
-        )  # Start or restart thread auto close
-
-        if self.close_task is not None:
-            # cancel closing if a thread message is sent.
-            self.bot.loop.create_task(self.cancel_closure())
-            self.bot.loop.create_task(
-                self.channel.send(
-                    embed=discord.Embed(
-                        color=self.bot.error_color,
-                        description="El cierre programado fue cancelado.",
-                    )
-                )
-            )
+    async def _drain_pending(self, error: Exception = None) -> None:
+        """Sends the messages received while the thread was set up, in arrival order."""
+        while self._pending_messages:
+            future, args = self._pending_messages.popleft()
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+                continue
+            try:
+                future.set_result(await self._relay(self._send, *args))
+            except Exception as e:
+                future.set_exception(e)
+        self._buffering = False
 
-        if not self.ready:
-            await self.wait_until_ready()
+    async def _send(
+        self,
+        message: discord.Message,
+        destination: typing.Union[
+            discord.TextChannel, discord.DMChannel, discord.User, discord.Member
+        ] = None,
+        from_mod: bool = False,
+        note: bool = False,
+        anonymous: bool = False,
+    ) -> None:
 
-        if not from_mod and not note:
-            self.bot.loop.create_task(self.bot.api.append_log(message, channel_id=self.channel.id))
+        self._restart_close_timer()  # Start or restart thread auto close
 
         destination = destination or self.channel
 
@@ -847,10 +977,32 @@ class Thread:
 
         msg = await destination.send(mentions, embed=embed)
 
+        if not from_mod and not note:
+            self.bot.linked_messages.add(
+                self.channel.id, msg.id, message.id, log_message_id=message.id
+            )
+
         if additional_images:
-            self.ready = False
             await asyncio.gather(*additional_images)
-            self.ready = True
+
+        if not from_mod and not note:
+            try:
+                await self.bot.api.append_log(message, channel_id=self.channel.id)
+            except Exception:
+                logger.error("Fallo al registrar el mensaje.", exc_info=True)
+
+        if self.close_task is not None:
+            # cancel closing if a thread message is sent.
+            await self.cancel_closure()
+            try:
+                await self.channel.send(
+                    embed=discord.Embed(
+                        color=self.bot.error_color,
+                        description="El cierre programado fue cancelado.",
+                    )
+                )
+            except discord.HTTPException:
+                logger.warning("No se pudo avisar que el cierre fue cancelado.", exc_info=True)
 
         return msg
 
@@ -858,26 +1010,598 @@ class Thread:
         key = str(self.id)
 
         mentions = []
-        mentions.extend(self.bot.config["subscriptions"].get(key, []))
+        mentions.extend(self.bot.stores.subscriptions.get(key, []))
+        mentions.extend(self.bot.stores.notification_squad.pop(key, []))
+
+        return " ".join(mentions)
+
+
+class CloseScheduler:
+    """
+    Closes the threads scheduled to be closed.
+
+    Every pending close is kept in a single timer heap and persisted
+    in the `closures` collection, one task waits for the earliest one.
+    When several closes are due at the same time they're spread
+    over a few seconds, so they don't all hit Discord at once.
+
+    Automatic closes only record the last activity of the thread in memory,
+    the timer is pushed back lazily when it fires. The persisted time is
+    written ahead of the deadline, at most once every `checkpoint_interval`
+    seconds per thread, so after a restart a thread is closed late, never early.
+    """
+
+    # at most this many seconds between the first and the last of a batch of closes
+    max_jitter = 30
+    checkpoint_interval = 300
+
+    def __init__(self, manager: "ThreadManager"):
+        self.manager = manager
+        self.bot = manager.bot
+        # key -> pending close
+        self._pending = {}
+        # (time, key), may hold stale entries, they're skipped when popped
+        self._heap = []
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    @staticmethod
+    def _key(recipient_id: int, auto_close: bool = False) -> str:
+        return f"{recipient_id}:auto" if auto_close else str(recipient_id)
+
+    def get(self, recipient_id: int, auto_close: bool = False) -> typing.Optional[dict]:
+        return self._pending.get(self._key(recipient_id, auto_close))
+
+    def schedule(
+        self,
+        recipient_id: int,
+        time: datetime,
+        *,
+        closer: typing.Union[discord.Member, discord.User],
+        silent: bool = False,
+        delete_channel: bool = True,
+        message: str = None,
+        auto_close: bool = False,
+    ) -> dict:
+        """Schedules a thread to be closed at `time`, replaces the previous one of the same kind."""
+        items = {
+            "time": time.isoformat(),
+            "closer_id": closer.id,
+            "silent": silent,
+            "delete_channel": delete_channel,
+            "message": message,
+            "auto_close": auto_close,
+        }
+        key = self._key(recipient_id, auto_close)
+        self.bot.stores.closures[key] = items
+        return self._push(key, recipient_id, time, items, closer)
+
+    def cancel(self, recipient_id: int, auto_close: bool = False) -> bool:
+        """Cancels a scheduled close, returns whether there was one."""
+        key = self._key(recipient_id, auto_close)
+        self.bot.stores.closures.pop(key, None)
+        return self._pending.pop(key, None) is not None
+
+    def touch(self, thread: Thread) -> None:
+        """Pushes the automatic close of a thread back, called for every message."""
+        timeout = self.bot.config.get("thread_auto_close")
+        key = self._key(thread.id, auto_close=True)
+
+        # Exit if timeout was not set
+        if timeout == isodate.Duration():
+            if key in self._pending:
+                self.cancel(thread.id, auto_close=True)
+            return
+
+        timeout = timedelta(seconds=timeout.total_seconds())
+        deadline = datetime.utcnow() + timeout
+        pending = self._pending.get(key)
+        if pending is not None:
+            pending["deadline"] = deadline
+            if datetime.fromisoformat(pending["items"]["time"]) >= deadline:
+                # the persisted time is still ahead of the deadline
+                return
+
+        checkpoint = deadline + timedelta(seconds=self.checkpoint_interval)
+        items = {
+            "time": checkpoint.isoformat(),
+            "closer_id": self.bot.user.id,
+            "delete_channel": True,
+            "auto_close": True,
+            **thread._auto_close_items(timeout),
+        }
+        self.bot.stores.closures[key] = items
+        if pending is not None:
+            pending["items"] = items
+        else:
+            self._push(key, thread.id, deadline, items, self.bot.user)
+
+    def _push(self, key, recipient_id, time, items, closer=None) -> dict:
+        pending = {
+            "recipient_id": recipient_id,
+            "time": time,
+            "deadline": time,
+            "items": items,
+            "closer": closer,
+        }
+        self._pending[key] = pending
+        heapq.heappush(self._heap, (time, key))
+        if self._heap[0][1] == key:
+            # sooner than what the runner is waiting for
+            self._wakeup.set()
+        self.start()
+        return pending
+
+    def restore(self) -> int:
+        """Loads the closes persisted before the restart, returns how many."""
+        for key, items in tuple(self.bot.stores.closures.items()):
+            recipient_id = int(key.split(":", 1)[0])
+            auto_close = items.get("auto_close", False)
+            new_key = self._key(recipient_id, auto_close)
+            if new_key != key:
+                # persisted before manual and automatic closes were kept apart
+                del self.bot.stores.closures[key]
+                self.bot.stores.closures[new_key] = items
+            self._push(new_key, recipient_id, datetime.fromisoformat(items["time"]), items)
+        return len(self._pending)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = self.bot.loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            timeout = None
+            if self._heap:
+                timeout = (self._heap[0][0] - datetime.utcnow()).total_seconds()
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+            due = []
+            now = datetime.utcnow()
+            while self._heap and self._heap[0][0] <= now:
+                time, key = heapq.heappop(self._heap)
+                pending = self._pending.get(key)
+                if pending is None or pending["time"] != time:
+                    continue
+                if pending["deadline"] > now:
+                    # there was some activity since, wait for the new deadline
+                    pending["time"] = pending["deadline"]
+                    heapq.heappush(self._heap, (pending["time"], key))
+                    continue
+                due.append(pending)
+
+            spread = min(len(due) - 1, self.max_jitter) if len(due) > 1 else 0
+            for pending in due:
+                self.bot.loop.create_task(self._fire(pending, random.uniform(0, spread)))
+
+    async def _fire(self, pending: dict, delay: float) -> None:
+        if delay:
+            await asyncio.sleep(delay)
+
+        items = pending["items"]
+        key = self._key(pending["recipient_id"], items.get("auto_close", False))
+        if self._pending.get(key) is not pending:
+            # cancelled or rescheduled in the meantime
+            return
+        self.cancel(pending["recipient_id"], items.get("auto_close", False))
+
+        thread = await self.manager.find(recipient_id=pending["recipient_id"])
+        if thread is None:
+            # the channel was deleted
+            logger.debug("Hilo de %s no encontrado, no se pudo cerrar.", pending["recipient_id"])
+            return
+
+        closer = pending["closer"] or self.bot.get_user(items["closer_id"]) or self.bot.user
+        try:
+            await thread._close(
+                closer, items["silent"], items["delete_channel"], items["message"], True
+            )
+        except Exception:
+            logger.error("Fallo al cerrar el hilo de %s.", pending["recipient_id"], exc_info=True)
+
+
+class CategoryPool:
+    """
+    Places new thread channels in the emptiest Modmail category.
 
-        if key in self.bot.config["notification_squad"]:
-            mentions.extend(self.bot.config["notification_squad"][key])
-            self.bot.config["notification_squad"].pop(key)
+    The pool is made of the main category, the `fallback_category_id`
+    category and the overflow categories ("Fallback Modmail").
+    Overflow categories are created in the background when less than
+    `headroom` channel slots are left, so new threads don't wait for them,
+    and deleted once they're empty. Their ids are kept in the
+    `overflow_category_ids` config, only those categories are ever deleted.
+    """
+
+    # Discord's limit of channels per category
+    capacity = 50
+    headroom = 10
+    overflow_name = "Fallback Modmail"
+
+    def __init__(self, manager: "ThreadManager"):
+        self.manager = manager
+        self.bot = manager.bot
+        self._overflow_ids = set()
+        # category id -> channels being created in it
+        self._reserved = {}
+        self._create_task = None
+
+    @property
+    def categories(self) -> typing.List[discord.CategoryChannel]:
+        main = self.bot.main_category
+        if main is None:
+            return []
+
+        ids = set(self._overflow_ids)
+        fallback_id = self.bot.config["fallback_category_id"]
+        if fallback_id:
+            try:
+                ids.add(int(fallback_id))
+            except ValueError:
+                pass
+        ids.discard(main.id)
+
+        categories = [main]
+        for id_ in ids:
+            category = main.guild.get_channel(id_)
+            # deleted overflow categories are forgotten by `on_channel_delete`
+            if isinstance(category, discord.CategoryChannel):
+                categories.append(category)
+        return categories
+
+    def free_slots(self, category: discord.CategoryChannel) -> int:
+        return self.capacity - len(category.channels) - self._reserved.get(category.id, 0)
+
+    def refresh(self) -> None:
+        """Loads the overflow categories created before a restart."""
+        existing = {c.id for c in self.bot.modmail_guild.categories}
+        for id_ in list(self.bot.config["overflow_category_ids"]):
+            try:
+                id_ = int(id_)
+            except ValueError:
+                continue
+            if id_ in existing:
+                self._overflow_ids.add(id_)
+            else:
+                self._forget(id_)
+        self._ensure_headroom()
+
+    def _forget(self, id_: int) -> None:
+        self._overflow_ids.discard(id_)
+        owned = self.bot.config["overflow_category_ids"]
+        if str(id_) in owned:
+            owned.remove(str(id_))
             self.bot.loop.create_task(self.bot.config.update())
 
-        return " ".join(mentions)
+    def _is_fallback(self, category: discord.CategoryChannel) -> bool:
+        return str(category.id) == str(self.bot.config["fallback_category_id"])
+
+    async def acquire(self) -> typing.Optional[discord.CategoryChannel]:
+        """Picks the category of a new thread channel, `release` it once it's created."""
+        while True:
+            categories = self.categories
+            if not categories:
+                return None
+            # the main category comes first on ties
+            category = max(categories, key=self.free_slots)
+            task = self._ensure_headroom()
+            if self.free_slots(category) > 0:
+                self._reserved[category.id] = self._reserved.get(category.id, 0) + 1
+                return category
+
+            # Every category is full, the spike outran the headroom
+            if task is None:
+                return category
+            await asyncio.wait({task})
+            if task.cancelled() or task.result() is None:
+                return category
+
+    def release(self, category: discord.CategoryChannel) -> None:
+        count = self._reserved.get(category.id, 0) - 1
+        if count > 0:
+            self._reserved[category.id] = count
+        else:
+            self._reserved.pop(category.id, None)
+
+    def _ensure_headroom(self) -> typing.Optional[asyncio.Task]:
+        if self._create_task is not None and not self._create_task.done():
+            return self._create_task
+
+        categories = self.categories
+        if not categories or sum(max(self.free_slots(c), 0) for c in categories) >= self.headroom:
+            return None
+
+        self._create_task = self.bot.loop.create_task(self._create_overflow(categories[0]))
+        return self._create_task
+
+    async def _create_overflow(
+        self, main: discord.CategoryChannel
+    ) -> typing.Optional[discord.CategoryChannel]:
+        try:
+            category = await main.clone(name=self.overflow_name)
+        except discord.HTTPException:
+            logger.error("Fallo al crear una categoría de respaldo.", exc_info=True)
+            return None
+        self._overflow_ids.add(category.id)
+        self.bot.config["overflow_category_ids"].append(str(category.id))
+        await self.bot.config.update()
+        logger.info("Creada la categoría de respaldo %s.", category.id)
+        return category
+
+    def on_channel_delete(self, channel: discord.abc.GuildChannel) -> None:
+        if channel.id in self._overflow_ids:
+            # an overflow category was deleted
+            self._forget(channel.id)
+            return
+
+        category = getattr(channel, "category", None)
+        if (
+            category is None
+            or category.id not in self._overflow_ids
+            or self._is_fallback(category)
+            or category.channels
+            or category.id in self._reserved
+        ):
+            return
+
+        others = sum(max(self.free_slots(c), 0) for c in self.categories if c != category)
+        if others < self.headroom:
+            return
+
+        self._forget(category.id)
+        self.bot.loop.create_task(self._delete(category))
+
+    async def _delete(self, category: discord.CategoryChannel) -> None:
+        try:
+            await category.delete(reason="Categoría de respaldo vacía.")
+        except discord.HTTPException:
+            logger.warning("Fallo al eliminar la categoría %s.", category.id, exc_info=True)
+        else:
+            logger.info("Eliminada la categoría de respaldo vacía %s.", category.id)
+
+
+class ChannelPool:
+    """
+    Keeps `thread_channel_pool_size` hidden channels ready in the main category.
+
+    A new thread claims one of them, it's renamed, gets its topic and the
+    permissions of the category, instead of creating a channel from scratch.
+    The pool is refilled in the background.
+    """
+
+    marker = "Canal de reserva de Modmail, no lo uses."
+    name = "reserva"
+
+    def __init__(self, manager: "ThreadManager"):
+        self.manager = manager
+        self.bot = manager.bot
+        self._channels = []
+        self._refill_task = None
+        self.hits = 0
+        self.misses = 0
+        # "pooled" / "created" -> [total seconds, count]
+        self._latency = {"pooled": [0.0, 0], "created": [0.0, 0]}
+
+    def __len__(self):
+        return len(self._channels)
+
+    @property
+    def size(self) -> int:
+        try:
+            return max(int(self.bot.config["thread_channel_pool_size"]), 0)
+        except (TypeError, ValueError):
+            logger.warning("Inválido thread_channel_pool_size, usando el valor por defecto.")
+            return int(self.bot.config.remove("thread_channel_pool_size"))
+
+    def metrics(self) -> dict:
+        """The pool hit rate and the average channel creation latency, with and without it."""
+        claims = self.hits + self.misses
+        return {
+            "size": len(self._channels),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / claims if claims else 0.0,
+            **{
+                f"{kind}_latency": total / count if count else 0.0
+                for kind, (total, count) in self._latency.items()
+            },
+        }
+
+    def record_latency(self, pooled: bool, seconds: float) -> None:
+        latency = self._latency["pooled" if pooled else "created"]
+        latency[0] += seconds
+        latency[1] += 1
+
+    def refresh(self) -> None:
+        """Finds the pooled channels created before a restart."""
+        self._channels = [
+            c for c in self.bot.modmail_guild.text_channels if c.topic == self.marker
+        ]
+        self.refill()
+
+    async def claim(
+        self, category: discord.CategoryChannel, *, name: str, topic: str
+    ) -> typing.Optional[discord.TextChannel]:
+        """Takes a pooled channel of `category` for a new thread, if there's one."""
+        while True:
+            channel = next((c for c in self._channels if c.category == category), None)
+            if channel is None:
+                if self.size:
+                    self.misses += 1
+                    self.refill()
+                return None
+
+            self._channels.remove(channel)
+            try:
+                await channel.edit(
+                    name=name, topic=topic, sync_permissions=True, reason="Creando un hilo..."
+                )
+            except discord.HTTPException:
+                # deleted in the meantime, try the next one
+                logger.warning("No se pudo usar el canal de reserva %s.", channel.id)
+                continue
+            self.hits += 1
+            self.refill()
+            return channel
+
+    def refill(self) -> None:
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = self.bot.loop.create_task(self._refill())
+
+    async def _refill(self) -> None:
+        try:
+            while len(self._channels) > self.size:
+                channel = self._channels.pop()
+                await channel.delete(reason="Canal de reserva de sobra.")
+
+            categories = self.manager.categories
+            category = self.bot.main_category
+            while len(self._channels) < self.size and category is not None:
+                if categories.free_slots(category) <= categories.headroom:
+                    # leave the room to the threads
+                    break
+                guild = category.guild
+                overwrites = {
+                    guild.default_role: discord.PermissionOverwrite(read_messages=False),
+                    guild.me: discord.PermissionOverwrite(read_messages=True),
+                }
+                channel = await guild.create_text_channel(
+                    name=self.name,
+                    category=category,
+                    overwrites=overwrites,
+                    topic=self.marker,
+                    reason="Canal de reserva para hilos.",
+                )
+                self._channels.append(channel)
+        except discord.HTTPException:
+            logger.error("Fallo al rellenar los canales de reserva.", exc_info=True)
+
+    def on_channel_delete(self, channel: discord.abc.GuildChannel) -> None:
+        if channel in self._channels:
+            self._channels.remove(channel)
+
+
+class AdmissionQueue:
+    """
+    Lets at most `thread_creation_rate` threads per minute be opened by users.
+
+    The creations beyond that wait in line, in order, and the user
+    is told their position. Messages sent meanwhile are buffered by
+    the thread, so a user is only in line once.
+    """
+
+    # how many creations may go through at once before the rate applies
+    burst = 5
+
+    def __init__(self, manager: "ThreadManager"):
+        self.manager = manager
+        self.bot = manager.bot
+        self._queue = deque()
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._task = None
+
+    def __len__(self):
+        return len(self._queue)
+
+    @property
+    def rate(self) -> float:
+        """Creations per second, 0 when unlimited."""
+        try:
+            return max(float(self.bot.config["thread_creation_rate"]), 0) / 60
+        except (TypeError, ValueError):
+            logger.warning("Inválido thread_creation_rate, usando el valor por defecto.")
+            return float(self.bot.config.remove("thread_creation_rate")) / 60
+
+    def _take(self) -> bool:
+        rate = self.rate
+        if not rate:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self._tokens + (now - self._updated) * rate, self.burst)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def acquire(self, thread: Thread) -> None:
+        """Waits until the thread can be created."""
+        if not self._queue and self._take():
+            return
+
+        future = self.bot.loop.create_future()
+        self._queue.append(future)
+        self.bot.loop.create_task(self._notify(thread, len(self._queue)))
+        if self._task is None or self._task.done():
+            self._task = self.bot.loop.create_task(self._release())
+        await future
+
+    async def _release(self) -> None:
+        while self._queue:
+            if not self._take():
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+            future = self._queue.popleft()
+            if not future.done():
+                future.set_result(None)
+
+    async def _notify(self, thread: Thread, position: int) -> None:
+        logger.info("Hilo de %s en la fila, posición %d.", thread.id, position)
+        if thread.recipient is None:
+            return
+        embed = discord.Embed(
+            color=self.bot.mod_color,
+            description=self.bot.formatter.format(
+                self.bot.config["thread_queue_response"], position=position
+            ),
+        )
+        try:
+            await thread.recipient.send(embed=embed)
+        except discord.HTTPException:
+            logger.warning("No se pudo avisar a %s de su posición.", thread.id)
 
 
 class ThreadManager:
     """Class that handles storing, finding and creating Modmail threads."""
 
+    # how many relay jobs may run at once, across every thread
+    max_concurrent_relays = 10
+
     def __init__(self, bot):
         self.bot = bot
+        self.closures = CloseScheduler(self)
+        self.categories = CategoryPool(self)
+        self.channel_pool = ChannelPool(self)
+        self.admission = AdmissionQueue(self)
+        # recipient id -> setup task of the thread being created
+        self._creating = {}
+        # messages dropped because too many were waiting for a thread to be set up
+        self.dropped_messages = 0
+        # the most messages that waited for a thread to be set up at once
+        self.max_pending_messages = 0
+        self.relay_semaphore = asyncio.Semaphore(self.max_concurrent_relays)
+        # recipient id -> Thread
         self.cache = {}
+        # channel id -> Thread
+        self.channel_cache = {}
+        # channel ids known not to belong to a thread
+        self._non_thread_channels = set()
+        self._populated = False
 
     async def populate_cache(self) -> None:
         for channel in self.bot.modmail_guild.text_channels:
             await self.find(channel=channel)
+        self._populated = True
+        self.categories.refresh()
+        self.channel_pool.refresh()
 
     def __len__(self):
         return len(self.cache)
@@ -888,6 +1612,58 @@ class ThreadManager:
     def __getitem__(self, item: str) -> Thread:
         return self.cache[item]
 
+    def register(self, thread: Thread) -> None:
+        """Adds a thread to both the recipient and the channel index."""
+        self.cache[thread.id] = thread
+        if thread.channel is not None:
+            self.channel_cache[thread.channel.id] = thread
+            self._non_thread_channels.discard(thread.channel.id)
+
+    def unregister(self, thread: Thread) -> bool:
+        """
+        Removes a thread from both indexes.
+
+        Returns whether the thread was registered.
+        """
+        found = False
+        if self.cache.get(thread.id) is thread:
+            del self.cache[thread.id]
+            found = True
+        if thread.channel is not None and self.channel_cache.get(thread.channel.id) is thread:
+            del self.channel_cache[thread.channel.id]
+            found = True
+        return found
+
+    def on_channel_create(self, channel: discord.abc.GuildChannel) -> None:
+        if isinstance(channel, discord.TextChannel) and channel.guild == self.bot.modmail_guild:
+            self._non_thread_channels.discard(channel.id)
+            self._find_from_channel(channel)
+
+    def on_channel_update(
+        self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel
+    ) -> None:
+        if not isinstance(after, discord.TextChannel) or before.topic == after.topic:
+            return
+        if after.guild != self.bot.modmail_guild:
+            return
+        self._non_thread_channels.discard(after.id)
+        thread = self.channel_cache.get(after.id)
+        if thread is not None:
+            # Keep the existing thread unless the topic now points to someone else
+            user_id = match_user_id(after.topic) if after.topic else -1
+            if user_id in (-1, thread.id):
+                return
+            self.unregister(thread)
+        self._find_from_channel(after)
+
+    def on_channel_delete(self, channel: discord.abc.GuildChannel) -> None:
+        self._non_thread_channels.discard(channel.id)
+        thread = self.channel_cache.pop(channel.id, None)
+        if thread is not None:
+            logger.debug("Canal del hilo %s eliminado del índice.", thread.id)
+        self.categories.on_channel_delete(channel)
+        self.channel_pool.on_channel_delete(channel)
+
     async def find(
         self,
         *,
@@ -895,21 +1671,29 @@ class ThreadManager:
         channel: discord.TextChannel = None,
         recipient_id: int = None,
     ) -> typing.Optional[Thread]:
-        """Finds a thread from cache or from discord channel topics."""
+        """
+        Finds a thread from cache or from discord channel topics.
+
+        Threads that are still being set up aren't returned, see `get_pending`.
+        """
         if recipient is None and channel is not None:
-            thread = self._find_from_channel(channel)
-            if thread is None:
-                user_id, thread = next(
-                    ((k, v) for k, v in self.cache.items() if v.channel == channel), (-1, None)
-                )
-                if thread is not None:
+            thread = self.channel_cache.get(channel.id)
+            if thread is not None:
+                if not channel.topic:
                     logger.debug("Hilo encontrado con una ID moderada")
-                    await channel.edit(topic=f"ID del usuario: {user_id}")
-            return thread
+                    await channel.edit(topic=f"ID del usuario: {thread.id}")
+                return thread
+            if channel.id in self._non_thread_channels:
+                return None
+            return self._find_from_channel(channel)
 
         if recipient:
             recipient_id = recipient.id
 
+        if recipient_id in self._creating:
+            # don't hold up the caller until the thread is set up, it may wait in line
+            return None
+
         thread = self.cache.get(recipient_id)
         if thread is not None:
             await thread.wait_until_ready()
@@ -921,13 +1705,14 @@ class ThreadManager:
                     thread.close(closer=self.bot.user, silent=True, delete_channel=False)
                 )
                 thread = None
-        else:
+        elif not self._populated:
+            # The channel index is not complete until the cache was populated
             channel = discord.utils.get(
                 self.bot.modmail_guild.text_channels, topic=f"ID del usuario: {recipient_id}"
             )
             if channel:
                 thread = Thread(self, recipient or recipient_id, channel)
-                self.cache[recipient_id] = thread
+                self.register(thread)
                 thread.ready = True
         return thread
 
@@ -944,6 +1729,7 @@ class ThreadManager:
             user_id = match_user_id(channel.topic)
 
         if user_id == -1:
+            self._non_thread_channels.add(channel.id)
             return None
 
         if user_id in self.cache:
@@ -951,9 +1737,10 @@ class ThreadManager:
 
         recipient = self.bot.get_user(user_id)
         if recipient is None:
-            self.cache[user_id] = thread = Thread(self, user_id, channel)
+            thread = Thread(self, user_id, channel)
         else:
-            self.cache[user_id] = thread = Thread(self, recipient, channel)
+            thread = Thread(self, recipient, channel)
+        self.register(thread)
         thread.ready = True
 
         return thread
@@ -967,6 +1754,9 @@ class ThreadManager:
     ) -> Thread:
         """Creates a Modmail thread"""
 
+        # the thread may be being created by a concurrent call
+        await self.wait_for_creation(recipient.id)
+
         # checks for existing thread in cache
         thread = self.cache.get(recipient.id)
         if thread:
@@ -981,24 +1771,71 @@ class ThreadManager:
 
         thread = Thread(self, recipient)
 
-        self.cache[recipient.id] = thread
+        self.register(thread)
 
         # Schedule thread setup for later
-        cat = self.bot.main_category
-        if category is None and len(cat.channels) == 50:
-            fallback_id = self.bot.config["fallback_category_id"]
-            if fallback_id:
-                fallback = discord.utils.get(cat.guild.categories, id=int(fallback_id))
-                if fallback and len(fallback.channels) != 50:
-                    category = fallback
-
-            if not category:
-                category = await cat.clone(name="Fallback Modmail")
-                self.bot.config.set("fallback_category_id", category.id)
-                await self.bot.config.update()
-
-        self.bot.loop.create_task(thread.setup(creator=creator, category=category))
+        task = self.bot.loop.create_task(self._setup(thread, creator, category))
+        self._creating[recipient.id] = task
+        task.add_done_callback(lambda t: self._creation_done(recipient.id, t))
         return thread
 
+    def relay_metrics(self) -> typing.Dict[int, dict]:
+        """The relay metrics of every thread, keyed by recipient ID."""
+        return {thread.id: thread.relay_metrics() for thread in self}
+
+    def get_pending(self, recipient_id: int) -> typing.Optional[Thread]:
+        """
+        The thread of `recipient_id` if it's still being set up.
+
+        Messages sent to it are buffered until the thread is ready.
+        """
+        if recipient_id in self._creating:
+            return self.cache.get(recipient_id)
+        return None
+
+    async def wait_for_creation(self, recipient_id: int) -> None:
+        """Waits until the thread of `recipient_id` is set up, if it's being created."""
+        while recipient_id in self._creating:
+            # `wait` doesn't raise, a failed setup leaves no thread behind
+            await asyncio.wait({self._creating[recipient_id]})
+
+    def _creation_done(self, recipient_id: int, task: asyncio.Task) -> None:
+        if self._creating.get(recipient_id) is task:
+            del self._creating[recipient_id]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Fallo al crear el hilo.", exc_info=task.exception())
+
+    @property
+    def queue_depth(self) -> int:
+        """The number of users waiting in line for their thread."""
+        return len(self.admission)
+
+    async def _setup(self, thread: Thread, creator, category) -> None:
+        pooled = category is None
+        try:
+            if creator is None:
+                # only the threads opened by users are rate limited
+                await self.admission.acquire(thread)
+            if pooled:
+                category = await self.categories.acquire()
+            await thread.setup(creator=creator, category=category)
+        except Exception as e:
+            if thread.channel is None:
+                # don't leave a thread without channel behind for the lookups
+                self.unregister(thread)
+                await thread._drain_pending(e)
+            else:
+                # the channel exists, e.g. only the recipient's DMs are closed
+                await thread._drain_pending()
+            raise
+        finally:
+            if pooled and category is not None:
+                self.categories.release(category)
+
+        if thread.channel is None:
+            await thread._drain_pending(CommandError("No se pudo crear el hilo."))
+        else:
+            await thread._drain_pending()
+
     async def find_or_create(self, recipient) -> Thread:
         return await self.find(recipient=recipient) or await self.create(recipient)
@@ -204,12 +204,12 @@ def cleanup_code(content: str) -> str:
     return content.strip("` \n")
 
 
-TOPIC_REGEX = re.compile(r"\bUser ID:\s*(\d{17,21})\b", flags=re.IGNORECASE)
+TOPIC_REGEX = re.compile(r"\b(?:User ID|ID del usuario):\s*(\d{17,21})\b", flags=re.IGNORECASE)
 
 
 def match_user_id(text: str) -> int:
     """
-    Matches a user ID in the format of "User ID: 12345".
+    Matches a user ID in the format of "ID del usuario: 12345" or "User ID: 12345".
 
     Parameters
     ----------
@@ -0,0 +1,65 @@
+"""
+Measures the config reads of a relayed message, with and without the converted values cache.
+
+Run it with `python -m tests.bench_config`.
+"""
+
+import argparse
+import timeit
+from unittest import mock
+
+from core.config import ConfigManager
+
+# the converted keys read while a message is relayed
+MESSAGE_KEYS = (
+    "recipient_color",
+    "mod_color",
+    "main_color",
+    "thread_auto_close",
+    "user_typing",
+    "mod_typing",
+)
+
+# as they are stored in the database
+STORED = {
+    "recipient_color": "#f1c40f",
+    "mod_color": "#2ecc71",
+    "main_color": "#7289da",
+    "thread_auto_close": "PT12H",
+    "user_typing": "yes",
+    "mod_typing": "no",
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=20000, help="mensajes simulados")
+    args = parser.parse_args()
+
+    config = ConfigManager(mock.MagicMock())
+    config.populate_cache()
+    config._cache.update(STORED)
+
+    def relay():
+        for key in MESSAGE_KEYS:
+            config.get(key)
+
+    def relay_uncached():
+        # every read converts the stored value again, like before the cache
+        for key in MESSAGE_KEYS:
+            config._converted.clear()
+            config.get(key)
+
+    uncached = timeit.timeit(relay_uncached, number=args.messages)
+    relay()
+    cached = timeit.timeit(relay, number=args.messages)
+
+    per_message = (uncached - cached) / args.messages * 1e6
+    print(f"{args.messages} mensajes, {len(MESSAGE_KEYS)} lecturas por mensaje")
+    print(f"  sin caché: {uncached * 1000:.1f} ms")
+    print(f"  con caché: {cached * 1000:.1f} ms")
+    print(f"  ahorro por mensaje: {per_message:.2f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Measures the time to the first relayed message of a new thread.
+
+Discord and the database are replaced by `FakeDiscord`, every request takes
+`--latency` seconds. Run it with `python -m tests.bench_thread_setup`.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from unittest import mock
+
+from core.thread import Thread
+from tests.fakes import FakeDiscord, make_bot
+
+
+async def first_relays(bot, discord: FakeDiscord, users: int, concurrent: bool) -> list:
+    relayed = {}
+
+    async def send(thread, message, *args):
+        # the relayed message is sent to the thread channel
+        await discord.request("send_message")
+        relayed.setdefault(thread.id, time.perf_counter())
+
+    async def open_thread(recipient) -> float:
+        start = time.perf_counter()
+        await bot.process_dm_modmail(discord.direct_message(recipient, "hola"))
+        return relayed[recipient.id] - start
+
+    recipients = [discord.recipient(1000 + i) for i in range(users)]
+    with mock.patch.object(Thread, "_send", send):
+        if concurrent:
+            return await asyncio.gather(*map(open_thread, recipients))
+        return [await open_thread(recipient) for recipient in recipients]
+
+
+def report(name: str, seconds: list, discord: FakeDiscord, users: int) -> None:
+    millis = sorted(s * 1000 for s in seconds)
+    print(
+        f"{name}: media {statistics.mean(millis):.1f} ms, "
+        f"p50 {statistics.median(millis):.1f} ms, máx {millis[-1]:.1f} ms"
+    )
+    requests = ", ".join(f"{route} {count / users:g}" for route, count in discord.requests.items())
+    print(f"  peticiones por hilo: {requests}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.05, help="segundos por petición")
+    parser.add_argument("--threads", type=int, default=20, help="hilos creados")
+    args = parser.parse_args()
+
+    for name, concurrent in (("secuencial", False), ("concurrente", True)):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        discord = FakeDiscord(args.latency)
+        bot = make_bot(loop, discord)
+        try:
+            seconds = loop.run_until_complete(
+                first_relays(bot, discord, args.threads, concurrent)
+            )
+            # let the background side effects (pins) finish before counting
+            loop.run_until_complete(asyncio.sleep(args.latency * 2))
+        finally:
+            loop.close()
+        report(name, seconds, discord, args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import asyncio
+from collections import Counter
+from datetime import datetime
+from types import MethodType, SimpleNamespace
+from unittest import mock
+
+from bot import ModmailBot
+from core.thread import ThreadManager
+
+
+async def noop(*args, **kwargs):
+    return None
+
+
+class FakeDiscord:
+    """
+    Stands in for the Discord HTTP API and the database calls of a thread setup.
+
+    Every request takes `latency` seconds and is counted in `requests` by route.
+    """
+
+    def __init__(self, latency: float = 0.0, *, channel_latency: float = None):
+        self.latency = latency
+        self.channel_latency = latency if channel_latency is None else channel_latency
+        self.requests = Counter()
+        self.channels = []
+        self.log_entries = []
+
+    async def request(self, route: str, latency: float = None) -> None:
+        self.requests[route] += 1
+        await asyncio.sleep(self.latency if latency is None else latency)
+
+    async def send_message(self, *args, **kwargs):
+        await self.request("send_message")
+        return SimpleNamespace(pin=self.pin)
+
+    async def pin(self):
+        await self.request("pin_message")
+
+    async def create_text_channel(self, **kwargs):
+        await self.request("create_channel", self.channel_latency)
+        channel = SimpleNamespace(
+            id=len(self.channels) + 1,
+            name=kwargs["name"],
+            created_at=datetime.utcnow(),
+            send=self.send_message,
+        )
+        self.channels.append(channel)
+        return channel
+
+    async def create_log_entry(self, recipient, channel, creator):
+        await self.request("create_log_entry")
+        self.log_entries.append(channel)
+        return f"https://example.com/logs/{len(self.log_entries)}"
+
+    async def get_user_log_count(self, user_id):
+        await self.request("count_logs")
+        return 0
+
+    def recipient(self, id_: int = 1234):
+        return SimpleNamespace(
+            id=id_,
+            bot=False,
+            name=f"usuario{id_}",
+            discriminator="0001",
+            mention=f"<@{id_}>",
+            avatar_url="https://cdn.discordapp.com/embed/avatars/0.png",
+            created_at=datetime(2020, 1, 1),
+            send=self.send_message,
+        )
+
+    @staticmethod
+    def direct_message(recipient, content):
+        return SimpleNamespace(author=recipient, content=content, channel=recipient)
+
+
+def make_bot(loop: asyncio.AbstractEventLoop, discord: FakeDiscord):
+    """
+    A bot with a real `ThreadManager` and `ModmailBot.process_dm_modmail`.
+
+    The admission queue and the category pool are bypassed, they have their own timing.
+    """
+    bot = mock.MagicMock()
+    bot.loop = loop
+    bot.config = {
+        "dm_disabled": 0,
+        "mention": "@here",
+        "thread_channel_pool_size": 0,
+        "recipient_thread_close": False,
+        "thread_creation_response": "Hemos recibido tu mensaje!",
+        "thread_creation_footer": "Tu mensaje fue enviado",
+        "thread_creation_title": "Hilo creado",
+    }
+    bot.main_color = bot.mod_color = 0
+    bot.guilds = []
+    bot.guild.get_member.return_value = None
+    bot.modmail_guild.text_channels = []
+    bot.modmail_guild.create_text_channel = discord.create_text_channel
+    bot.api.create_log_entry = discord.create_log_entry
+    bot.api.get_user_log_count = discord.get_user_log_count
+
+    async def retrieve_emoji():
+        return "✅", "🚫"
+
+    async def not_blocked(message):
+        return False
+
+    bot.retrieve_emoji = retrieve_emoji
+    bot._process_blocked = not_blocked
+    bot.get_thread_cooldown = noop
+    bot.add_reaction = noop
+    bot.process_dm_modmail = MethodType(ModmailBot.process_dm_modmail, bot)
+
+    bot.threads = manager = ThreadManager(bot)
+    manager._populated = True
+    manager.admission.acquire = noop
+    manager.categories.acquire = noop
+    return bot
@@ -0,0 +1,74 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from core.thread import Thread
+from tests.fakes import FakeDiscord, make_bot
+
+
+class ThreadCreationTest(unittest.TestCase):
+    """Many first messages from the same user arrive while the thread is being set up."""
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.discord = FakeDiscord(channel_latency=0.05)
+        self.bot = make_bot(self.loop, self.discord)
+        self.manager = self.bot.threads
+        self.recipient = self.discord.recipient()
+        self.relayed = []
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def run_relayed(self, coro):
+        test = self
+
+        async def send(thread, message, *args):
+            test.relayed.append(message.content)
+
+        with mock.patch.object(Thread, "_send", send):
+            return self.loop.run_until_complete(coro)
+
+    def test_single_channel_for_concurrent_messages(self):
+        contents = list(range(Thread.max_pending_messages))
+
+        async def burst():
+            await asyncio.gather(
+                *(
+                    self.bot.process_dm_modmail(self.discord.direct_message(self.recipient, c))
+                    for c in contents
+                )
+            )
+
+        self.run_relayed(burst())
+
+        self.assertEqual(len(self.discord.channels), 1)
+        self.assertEqual(self.discord.log_entries, self.discord.channels)
+        self.assertEqual(len(self.manager), 1)
+        self.assertIs(self.manager.cache[self.recipient.id].channel, self.discord.channels[0])
+        self.assertEqual(self.relayed, contents)
+        self.assertEqual(self.manager.dropped_messages, 0)
+        self.assertFalse(self.manager._creating)
+
+    def test_find_does_not_wait_for_setup(self):
+        self.discord.channel_latency = 60
+
+        async def lookup():
+            thread = await self.manager.create(self.recipient)
+            found = await asyncio.wait_for(self.manager.find(recipient=self.recipient), 1)
+            pending = self.manager.get_pending(self.recipient.id)
+            task = self.manager._creating[self.recipient.id]
+            task.cancel()
+            await asyncio.wait({task})
+            return thread, found, pending
+
+        thread, found, pending = self.run_relayed(lookup())
+
+        self.assertIsNone(found)
+        self.assertIs(pending, thread)
+
+
+if __name__ == "__main__":
+    unittest.main()